@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class CatalogStar:
+    name: str
+    ra_hours: float  # Ascensión recta en horas
+    dec_deg: float   # Declinación en grados
+    magnitude: float
+    # Campos opcionales enriquecidos (si existen en el catálogo)
+    distance_ly: Optional[float] = None
+    color_temp_K: Optional[float] = None
+    bv: Optional[float] = None
+    rgb_hex: Optional[str] = None
+    aliases: Optional[List[str]] = None
+    ids: Optional[Dict[str, int]] = None
+
+
+def _optional_float(value: float) -> Optional[float]:
+    # NaN marca "sin dato" en las columnas opcionales
+    return None if value != value else float(value)
+
+
+class StarCatalog:
+    """Catálogo de estrellas en formato columnar (struct-of-arrays).
+
+    - Columnas float64 contiguas: `ra_hours`, `dec_deg`, `magnitude`, `distance_ly`,
+      `color_temp_K`, `bv` (NaN = sin dato en las opcionales).
+    - Tabla de nombres internada (`names`) con índice inverso `index_of`.
+    - `rgb_hex` como tabla de strings únicos + índice por fila (-1 = sin dato).
+    - `aliases` / `ids` como tablas dispersas {fila: valor}, solo para filas que los tienen.
+
+    Para compatibilidad se comporta como una secuencia de `CatalogStar`: indexar o
+    iterar entrega vistas construidas bajo demanda a partir de las columnas.
+    """
+
+    __slots__ = (
+        "names",
+        "ra_hours",
+        "dec_deg",
+        "magnitude",
+        "distance_ly",
+        "color_temp_K",
+        "bv",
+        "rgb_table",
+        "rgb_index",
+        "aliases",
+        "ids",
+        "_name_index",
+    )
+
+    def __init__(
+        self,
+        *,
+        names: List[str],
+        ra_hours: np.ndarray,
+        dec_deg: np.ndarray,
+        magnitude: np.ndarray,
+        distance_ly: np.ndarray,
+        color_temp_K: np.ndarray,
+        bv: np.ndarray,
+        rgb_table: List[str],
+        rgb_index: np.ndarray,
+        aliases: Mapping[int, List[str]],
+        ids: Mapping[int, Dict[str, int]],
+    ) -> None:
+        n = len(names)
+        for column in (ra_hours, dec_deg, magnitude, distance_ly, color_temp_K, bv, rgb_index):
+            if len(column) != n:
+                raise ValueError("Columnas del catálogo con longitudes inconsistentes")
+        self.names = names
+        self.ra_hours = ra_hours
+        self.dec_deg = dec_deg
+        self.magnitude = magnitude
+        self.distance_ly = distance_ly
+        self.color_temp_K = color_temp_K
+        self.bv = bv
+        self.rgb_table = rgb_table
+        self.rgb_index = rgb_index
+        self.aliases = aliases
+        self.ids = ids
+        # Ante nombres duplicados gana la última fila, igual que {s.name: s for s in catalog}
+        self._name_index: Dict[str, int] = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def from_records(cls, raw: Iterable[Mapping[str, object]]) -> "StarCatalog":
+        """Construye el catálogo desde registros JSON (esquema nuevo o anterior)."""
+        names: List[str] = []
+        ra_list: List[float] = []
+        dec_list: List[float] = []
+        mag_list: List[float] = []
+        dist_list: List[float] = []
+        temp_list: List[float] = []
+        bv_list: List[float] = []
+        rgb_table: List[str] = []
+        rgb_lookup: Dict[str, int] = {}
+        rgb_rows: List[int] = []
+        aliases: Dict[int, List[str]] = {}
+        ids: Dict[int, Dict[str, int]] = {}
+
+        nan = float("nan")
+        for row, item in enumerate(raw):
+            # Aceptar ambos esquemas: nuevo (ra, dec, mag) y anterior (ra_hours, dec_deg, magnitude)
+            ra_value = item.get("ra", item.get("ra_hours"))
+            dec_value = item.get("dec", item.get("dec_deg"))
+            mag_value = item.get("mag", item.get("magnitude"))
+
+            if ra_value is None or dec_value is None or mag_value is None or "name" not in item:
+                raise ValueError("Entrada de catálogo inválida: se requieren name, y ra/ra_hours, dec/dec_deg, mag/magnitude")
+
+            names.append(sys.intern(str(item["name"])))
+            ra_list.append(float(ra_value))
+            dec_list.append(float(dec_value))
+            mag_list.append(float(mag_value))
+            dist_list.append(float(item["distance_ly"]) if item.get("distance_ly") is not None else nan)
+            temp_list.append(float(item["color_temp_K"]) if item.get("color_temp_K") is not None else nan)
+            bv_list.append(float(item["bv"]) if item.get("bv") is not None else nan)
+
+            rgb = item.get("rgb_hex")
+            if rgb is None:
+                rgb_rows.append(-1)
+            else:
+                rgb = str(rgb)
+                if rgb not in rgb_lookup:
+                    rgb_lookup[rgb] = len(rgb_table)
+                    rgb_table.append(rgb)
+                rgb_rows.append(rgb_lookup[rgb])
+
+            if item.get("aliases") is not None:
+                aliases[row] = list(item["aliases"])  # type: ignore[arg-type]
+            if item.get("ids") is not None:
+                ids[row] = dict(item["ids"])  # type: ignore[arg-type]
+
+        return cls(
+            names=names,
+            ra_hours=np.asarray(ra_list, dtype=np.float64),
+            dec_deg=np.asarray(dec_list, dtype=np.float64),
+            magnitude=np.asarray(mag_list, dtype=np.float64),
+            distance_ly=np.asarray(dist_list, dtype=np.float64),
+            color_temp_K=np.asarray(temp_list, dtype=np.float64),
+            bv=np.asarray(bv_list, dtype=np.float64),
+            rgb_table=rgb_table,
+            rgb_index=np.asarray(rgb_rows, dtype=np.int32),
+            aliases=aliases,
+            ids=ids,
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, row: int) -> CatalogStar:
+        if row < 0:
+            row += len(self.names)
+        if not 0 <= row < len(self.names):
+            raise IndexError("Índice fuera del catálogo")
+        return self.star(row)
+
+    def __iter__(self) -> Iterator[CatalogStar]:
+        for row in range(len(self.names)):
+            yield self.star(row)
+
+    def star(self, row: int) -> CatalogStar:
+        """Vista `CatalogStar` de la fila indicada."""
+        rgb_ix = int(self.rgb_index[row])
+        return CatalogStar(
+            name=self.names[row],
+            ra_hours=float(self.ra_hours[row]),
+            dec_deg=float(self.dec_deg[row]),
+            magnitude=float(self.magnitude[row]),
+            distance_ly=_optional_float(self.distance_ly[row]),
+            color_temp_K=_optional_float(self.color_temp_K[row]),
+            bv=_optional_float(self.bv[row]),
+            rgb_hex=self.rgb_table[rgb_ix] if rgb_ix >= 0 else None,
+            aliases=self.aliases.get(row),
+            ids=self.ids.get(row),
+        )
+
+    def index_of(self, name: str) -> Optional[int]:
+        """Fila del catálogo para `name`, o None si no existe."""
+        return self._name_index.get(name)
+
+    def get(self, name: str) -> Optional[CatalogStar]:
+        row = self._name_index.get(name)
+        return None if row is None else self.star(row)
+
+
+# ----------------------- Formato binario (memory-mapped) ----------------------
+#
+# Diseño (little-endian, versión 1):
+#   header   : magic "SCAT", version u16, reservado u16, count u32, padding,
+#              heap_size u64, source_size u64, source_mtime_ns u64 (40 bytes)
+#   columnas : 6 bloques contiguos float64[count] en el orden de _FLOAT_COLUMNS
+#   refs     : count registros fijos de 8 x u32 (offset, longitud) para
+#              name, rgb_hex, aliases (JSON) e ids (JSON) dentro del heap
+#   heap     : bytes UTF-8 de los strings referenciados
+#
+# Un `len` igual a _NO_VALUE indica campo ausente. Las columnas se exponen como
+# vistas de solo lectura sobre el mmap, por lo que todos los workers comparten
+# las mismas páginas del page cache.
+
+CATALOG_MAGIC = b"SCAT"
+CATALOG_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHI4xQQQ")
+_FLOAT_COLUMNS = ("ra_hours", "dec_deg", "magnitude", "distance_ly", "color_temp_K", "bv")
+_REF_FIELDS = 8
+_NO_VALUE = 0xFFFFFFFF
+
+
+def _source_stamp(source_path: Optional[Path]) -> Tuple[int, int]:
+    if source_path is None or not source_path.exists():
+        return 0, 0
+    st = source_path.stat()
+    return int(st.st_size), int(st.st_mtime_ns)
+
+
+def compile_catalog(json_path: Path, bin_path: Path) -> int:
+    """Compila el catálogo JSON a formato binario versionado.
+
+    Valida las entradas con las mismas reglas que el loader JSON. Escribe a un
+    archivo temporal y lo renombra, para que un worker nunca mapee un archivo
+    a medio escribir. Devuelve la cantidad de estrellas escritas.
+    """
+    with json_path.open("r", encoding="utf-8") as f:
+        raw = json.load(f)
+    cat = StarCatalog.from_records(raw)
+    n = len(cat)
+
+    heap = bytearray()
+    interned: Dict[bytes, int] = {}
+
+    def put(value: Optional[str]) -> Tuple[int, int]:
+        if value is None:
+            return 0, _NO_VALUE
+        data = value.encode("utf-8")
+        off = interned.get(data)
+        if off is None:
+            off = len(heap)
+            interned[data] = off
+            heap.extend(data)
+        return off, len(data)
+
+    refs = np.zeros((n, _REF_FIELDS), dtype="<u4")
+    for row in range(n):
+        star = cat.star(row)
+        refs[row, 0:2] = put(star.name)
+        refs[row, 2:4] = put(star.rgb_hex)
+        refs[row, 4:6] = put(json.dumps(star.aliases, ensure_ascii=False) if star.aliases is not None else None)
+        refs[row, 6:8] = put(json.dumps(star.ids, ensure_ascii=False) if star.ids is not None else None)
+
+    source_size, source_mtime_ns = _source_stamp(json_path)
+    tmp_path = bin_path.with_name(bin_path.name + ".tmp")
+    with tmp_path.open("wb") as out:
+        out.write(_HEADER.pack(CATALOG_MAGIC, CATALOG_FORMAT_VERSION, 0, n, len(heap), source_size, source_mtime_ns))
+        for column in _FLOAT_COLUMNS:
+            out.write(np.ascontiguousarray(getattr(cat, column), dtype="<f8").tobytes())
+        out.write(refs.tobytes())
+        out.write(bytes(heap))
+    os.replace(tmp_path, bin_path)
+    return n
+
+
+class _HeapJsonTable(Mapping[int, object]):
+    """Tabla dispersa {fila: valor} cuyos valores se decodifican del heap bajo demanda."""
+
+    __slots__ = ("_heap", "_spans")
+
+    def __init__(self, heap: memoryview, spans: Dict[int, Tuple[int, int]]) -> None:
+        self._heap = heap
+        self._spans = spans
+
+    def __getitem__(self, row: int) -> object:
+        off, length = self._spans[row]
+        return json.loads(bytes(self._heap[off:off + length]).decode("utf-8"))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._spans)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+
+def load_binary_catalog(bin_path: Path, source_path: Optional[Path] = None) -> StarCatalog:
+    """Abre un catálogo compilado con `compile_catalog` mediante mmap de solo lectura.
+
+    Si se indica `source_path` y el JSON cambió desde la compilación, lanza
+    ValueError para que el llamador pueda recurrir al JSON.
+    """
+    with bin_path.open("rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mm) < _HEADER.size:
+        raise ValueError(f"Catálogo binario truncado: {bin_path}")
+    magic, version, _reserved, n, heap_size, source_size, source_mtime_ns = _HEADER.unpack_from(mm, 0)
+    if magic != CATALOG_MAGIC or version != CATALOG_FORMAT_VERSION:
+        raise ValueError(f"Catálogo binario incompatible: {bin_path}")
+    expected = _HEADER.size + n * 8 * len(_FLOAT_COLUMNS) + n * 4 * _REF_FIELDS + heap_size
+    if len(mm) != expected:
+        raise ValueError(f"Catálogo binario truncado: {bin_path}")
+    if source_path is not None and source_path.exists() and _source_stamp(source_path) != (source_size, source_mtime_ns):
+        raise ValueError(f"Catálogo binario desactualizado respecto a {source_path}")
+
+    offset = _HEADER.size
+    columns: Dict[str, np.ndarray] = {}
+    for column in _FLOAT_COLUMNS:
+        columns[column] = np.frombuffer(mm, dtype="<f8", count=n, offset=offset)
+        offset += n * 8
+    refs = np.frombuffer(mm, dtype="<u4", count=n * _REF_FIELDS, offset=offset).reshape(n, _REF_FIELDS)
+    offset += n * 4 * _REF_FIELDS
+    heap = memoryview(mm)[offset:offset + heap_size]
+
+    names = [
+        sys.intern(bytes(heap[off:off + length]).decode("utf-8"))
+        for off, length in refs[:, 0:2].tolist()
+    ]
+
+    # rgb_hex: los strings se deduplicaron al compilar, así que cada offset distinto es un color
+    has_rgb = refs[:, 3] != _NO_VALUE
+    rgb_offsets, first_rows = np.unique(refs[has_rgb, 2], return_index=True)
+    rgb_lengths = refs[has_rgb, 3][first_rows]
+    rgb_table = [
+        bytes(heap[off:off + length]).decode("utf-8")
+        for off, length in zip(rgb_offsets.tolist(), rgb_lengths.tolist())
+    ]
+    rgb_index = np.full(n, -1, dtype=np.int32)
+    rgb_index[has_rgb] = np.searchsorted(rgb_offsets, refs[has_rgb, 2])
+
+    def spans(off_col: int) -> Dict[int, Tuple[int, int]]:
+        rows = np.flatnonzero(refs[:, off_col + 1] != _NO_VALUE)
+        return {
+            row: (off, length)
+            for row, off, length in zip(rows.tolist(), refs[rows, off_col].tolist(), refs[rows, off_col + 1].tolist())
+        }
+
+    return StarCatalog(
+        names=names,
+        rgb_table=rgb_table,
+        rgb_index=rgb_index,
+        aliases=_HeapJsonTable(heap, spans(4)),  # type: ignore[arg-type]
+        ids=_HeapJsonTable(heap, spans(6)),  # type: ignore[arg-type]
+        **columns,
+    )
+
+
+if __name__ == "__main__":
+    # Paso de build: python catalog.py [star_catalog.json] [star_catalog.bin]
+    import argparse
+
+    here = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Compila star_catalog.json a formato binario memory-mapped")
+    parser.add_argument("source", nargs="?", default=str(here / "star_catalog.json"))
+    parser.add_argument("output", nargs="?", default=str(here / "star_catalog.bin"))
+    args = parser.parse_args()
+    count = compile_catalog(Path(args.source), Path(args.output))
+    print(f"{count} estrellas -> {args.output}")
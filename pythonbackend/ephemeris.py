@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import mmap
+import os
+import threading
+import time
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Set, Tuple
+
+from jplephem.calendar import compute_calendar_date, compute_julian_day
+from jplephem.excerpter import write_excerpt
+from jplephem.spk import SPK
+from skyfield.api import load_file
+from skyfield.jpllib import SpiceKernel
+
+# Kernel por defecto (junto al módulo); se puede reemplazar con la variable de entorno
+DEFAULT_KERNEL_NAME = "de421.bsp"
+EPHEMERIS_PATH_ENV = "EPHEMERIS_PATH"
+
+# Kernel recortado (ventana de fechas + solo los cuerpos del servicio), ver `build_trimmed_kernel`
+TRIMMED_KERNEL_NAME = "de421_trimmed.bsp"
+EPHEMERIS_TRIMMED_ENV = "EPHEMERIS_TRIMMED"
+TRIMMED_KERNEL_YEARS_BEFORE = 10
+TRIMMED_KERNEL_YEARS_AFTER = 20
+
+# Cuerpos que consultan `get_visible_bodies` y `get_astronomy_events` (claves de Skyfield)
+SERVICE_BODY_KEYS: Tuple[str, ...] = (
+    "earth",
+    "sun",
+    "moon",
+    "mercury",
+    "venus",
+    "mars",
+    "jupiter barycenter",
+    "saturn barycenter",
+    "uranus barycenter",
+    "neptune barycenter",
+)
+
+# Sufijos de descargas a medio terminar (p. ej. `de421.bsp.download` de Skyfield)
+_PARTIAL_SUFFIXES = (".download", ".part", ".partial", ".tmp")
+
+_DAF_RECORD_BYTES = 1024
+
+_status_lock = threading.Lock()
+_status: Dict[str, object] = {
+    "state": "cold",
+    "path": None,
+    "coverage": None,
+    "error": None,
+    "warmup_ms": None,
+    "warmup_error": None,
+}
+
+
+def _module_dir() -> Path:
+    return Path(__file__).resolve().parent
+
+
+def _trimmed_from_env() -> bool:
+    return os.environ.get(EPHEMERIS_TRIMMED_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def kernel_path(trimmed: Optional[bool] = None) -> Path:
+    """Ruta del kernel SPK.
+
+    `$EPHEMERIS_PATH` tiene prioridad. Si no, con `trimmed` (por defecto
+    `$EPHEMERIS_TRIMMED`) se usa `de421_trimmed.bsp` cuando existe, y si no
+    `de421.bsp`, ambos junto al módulo.
+    """
+    override = os.environ.get(EPHEMERIS_PATH_ENV)
+    if override:
+        return Path(override).expanduser().resolve()
+    if trimmed is None:
+        trimmed = _trimmed_from_env()
+    if trimmed and (_module_dir() / TRIMMED_KERNEL_NAME).is_file():
+        return _module_dir() / TRIMMED_KERNEL_NAME
+    return _module_dir() / DEFAULT_KERNEL_NAME
+
+
+def validate_kernel(path: Path) -> None:
+    """Verifica que `path` sea un SPK completo antes de mapearlo.
+
+    Rechaza descargas parciales (por sufijo o por tamaño): el encabezado DAF
+    debe ser válido y todos los segmentos deben caber dentro del archivo.
+    Lanza ValueError con el motivo.
+    """
+    if path.name.endswith(_PARTIAL_SUFFIXES):
+        raise ValueError(f"Kernel de efemérides a medio descargar: {path}")
+    _check_spk(path)
+
+
+def _check_spk(path: Path) -> None:
+    if not path.is_file():
+        raise ValueError(f"Kernel de efemérides no encontrado: {path}")
+    size = path.stat().st_size
+    if size < _DAF_RECORD_BYTES:
+        raise ValueError(f"Kernel de efemérides truncado: {path}")
+    try:
+        spk = SPK.open(str(path))
+    except Exception as exc:  # encabezado o resúmenes ilegibles
+        raise ValueError(f"Kernel de efemérides inválido: {path} ({exc})") from exc
+    try:
+        if not spk.daf.locidw.startswith((b"DAF/SPK", b"NAIF/DAF")):
+            raise ValueError(f"El archivo no es un kernel SPK: {path}")
+        if not spk.segments:
+            raise ValueError(f"Kernel de efemérides sin segmentos: {path}")
+        last_word = max(max(segment.end_i for segment in spk.segments), spk.daf.free - 1)
+        if last_word * 8 > size:
+            raise ValueError(f"Kernel de efemérides truncado: {path}")
+    finally:
+        spk.close()
+
+
+def _set_status(**changes: object) -> None:
+    with _status_lock:
+        _status.update(changes)
+
+
+def ephemeris_status() -> Dict[str, object]:
+    """Estado del kernel para `/health`: cold | loading | warming | ready | error."""
+    with _status_lock:
+        return dict(_status)
+
+
+def _jd_to_iso_date(jd: float) -> str:
+    year, month, day = compute_calendar_date(int(jd + 0.5))
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def kernel_coverage(kernel: SpiceKernel) -> Tuple[float, float]:
+    """(JD inicial, JD final) TDB cubierto por todos los segmentos del kernel."""
+    segments = kernel.spk.segments
+    return max(seg.start_jd for seg in segments), min(seg.end_jd for seg in segments)
+
+
+@lru_cache(maxsize=2)
+def load_ephemeris(trimmed: Optional[bool] = None) -> SpiceKernel:
+    """Abre el kernel validado (ver `kernel_path`). jplephem lo mapea con mmap de solo lectura.
+
+    Los coeficientes se leen directo del mapeo, sin copias. Así las páginas
+    quedan en el page cache del sistema, compartidas por todos los workers
+    que abren el mismo archivo. Si falla, no queda cacheado y el próximo
+    llamado reintenta. Con el kernel recortado, un instante fuera de su
+    cobertura lanza `EphemerisRangeError` (un ValueError).
+    """
+    path = kernel_path(trimmed)
+    _set_status(state="loading", path=str(path), error=None)
+    try:
+        validate_kernel(path)
+        kernel = load_file(str(path))
+    except Exception as exc:
+        _set_status(state="error", error=str(exc))
+        raise
+    start_jd, end_jd = kernel_coverage(kernel)
+    _set_status(state="ready", coverage={"start": _jd_to_iso_date(start_jd), "end": _jd_to_iso_date(end_jd)})
+    return kernel
+
+
+def _advise_willneed(kernel: SpiceKernel) -> None:
+    # Pedir al kernel del SO que lea el archivo por adelantado (best-effort).
+    # `_map` es interno de jplephem: si cambia, esto queda sin efecto sin fallar.
+    daf = getattr(getattr(kernel, "spk", None), "daf", None)
+    mapping = getattr(getattr(daf, "_map", None), "obj", None)
+    advice = getattr(mmap, "MADV_WILLNEED", None)
+    if isinstance(mapping, mmap.mmap) and advice is not None:
+        try:
+            mapping.madvise(advice)
+        except OSError:
+            pass
+
+
+def warm_up(targets: Sequence[str], t, on_ready: Optional[Callable[[], None]] = None) -> Dict[str, object]:
+    """Carga el kernel y evalúa `targets` en `t` para mapear sus segmentos.
+
+    `on_ready` (opcional) corre con el kernel ya cargado (p. ej. para
+    precalcular tablas). Los errores quedan en `ephemeris_status()` y no se
+    propagan: el servicio arranca igual y solo los endpoints de
+    cuerpos/eventos fallan. Un fallo de `on_ready` no invalida el kernel:
+    queda en `warmup_error` con `state="ready"` (los requests usan el
+    cálculo completo).
+    """
+    started = time.perf_counter()
+    try:
+        kernel = load_ephemeris()
+        _set_status(state="warming")
+        for target in targets:
+            kernel[target].at(t)
+        _advise_willneed(kernel)
+    except Exception as exc:
+        _set_status(state="error", error=str(exc))
+        return ephemeris_status()
+    warmup_error: Optional[str] = None
+    if on_ready is not None:
+        try:
+            on_ready()
+        except Exception as exc:
+            warmup_error = str(exc)
+    _set_status(
+        state="ready",
+        error=None,
+        warmup_error=warmup_error,
+        warmup_ms=round((time.perf_counter() - started) * 1000.0, 1),
+    )
+    return ephemeris_status()
+
+
+def _segment_pairs(kernel: SpiceKernel, body_keys: Sequence[str]) -> Set[Tuple[int, int]]:
+    """(centro, objetivo) de los segmentos que encadena Skyfield para `body_keys`."""
+    pairs: Set[Tuple[int, int]] = set()
+    for key in body_keys:
+        vector = kernel[key]
+        for segment in getattr(vector, "vector_functions", (vector,)):
+            pairs.add((int(segment.center), int(segment.target)))
+    return pairs
+
+
+def _jd_at_midnight(day: date) -> float:
+    return compute_julian_day(day.year, day.month, day.day) - 0.5
+
+
+def build_trimmed_kernel(
+    source_path: Path,
+    output_path: Path,
+    *,
+    start: date,
+    end: date,
+    body_keys: Sequence[str] = SERVICE_BODY_KEYS,
+) -> Dict[str, object]:
+    """Extrae de `source_path` un SPK con solo [start, end] y los segmentos de `body_keys`.
+
+    Los segmentos se recortan a los bloques de Chebyshev que tocan la ventana.
+    Escribe a un archivo temporal, lo valida y lo renombra, para que un
+    worker nunca mapee un kernel a medio escribir. Devuelve un resumen.
+    """
+    if end <= start:
+        raise ValueError("end debe ser posterior a start")
+    validate_kernel(source_path)
+    source = load_file(str(source_path))
+    try:
+        source_start, source_end = kernel_coverage(source)
+        start_jd = max(_jd_at_midnight(start), source_start)
+        end_jd = min(_jd_at_midnight(end), source_end)
+        if end_jd <= start_jd:
+            raise ValueError("La ventana pedida no se solapa con la cobertura del kernel")
+        wanted = _segment_pairs(source, body_keys)
+        spk = source.spk
+        summaries = [
+            summary
+            for summary, segment in zip(spk.daf.summaries(), spk.segments)
+            if (segment.center, segment.target) in wanted
+        ]
+        tmp_path = output_path.with_name(output_path.name + ".tmp")
+        with tmp_path.open("w+b") as out:
+            write_excerpt(spk, out, start_jd, end_jd, summaries)
+    finally:
+        source.close()
+    _check_spk(tmp_path)
+    os.replace(tmp_path, output_path)
+    return {
+        "segments": len(summaries),
+        "start": _jd_to_iso_date(start_jd),
+        "end": _jd_to_iso_date(end_jd),
+        "bytes": output_path.stat().st_size,
+    }
+
+
+if __name__ == "__main__":
+    # Paso de build: python ephemeris.py [de421.bsp] [de421_trimmed.bsp] [--start AAAA-MM-DD] [--end AAAA-MM-DD]
+    import argparse
+
+    here = Path(__file__).resolve().parent
+    today = date.today()
+    parser = argparse.ArgumentParser(description="Recorta el kernel SPK a la ventana de fechas y los cuerpos del servicio")
+    parser.add_argument("source", nargs="?", default=str(here / DEFAULT_KERNEL_NAME))
+    parser.add_argument("output", nargs="?", default=str(here / TRIMMED_KERNEL_NAME))
+    parser.add_argument("--start", type=date.fromisoformat, default=date(today.year - TRIMMED_KERNEL_YEARS_BEFORE, 1, 1))
+    parser.add_argument("--end", type=date.fromisoformat, default=date(today.year + TRIMMED_KERNEL_YEARS_AFTER, 1, 1))
+    args = parser.parse_args()
+    summary = build_trimmed_kernel(Path(args.source), Path(args.output), start=args.start, end=args.end)
+    print(f"{summary['segments']} segmentos, {summary['start']}..{summary['end']}, {summary['bytes']} bytes -> {args.output}")
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import json
+import math
+from array import array
+from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Sequence
+
+import numpy as np
 
 
 def _module_dir() -> Path:
@@ -118,25 +123,352 @@ def _point_in_polygon_2d(x: float, y: float, poly: List[Tuple[float, float]]) ->
     return inside
 
 
+# Rejilla del índice: bandas de Dec x bins de RA (grados).
+IAU_INDEX_DEC_BAND_DEG = 10.0
+IAU_INDEX_RA_BIN_DEG = 15.0
+
+
+@dataclass(frozen=True)
+class _IauPolygon:
+    """Polígono IAU con vértices desenrollados (RA continua) y caja envolvente.
+
+    Si el polígono abarca >= 180° de RA (`wide`), el desenrollado fijo no es
+    equivalente al ajuste por punto y se usa el camino original.
+    """
+
+    name: str
+    vertices: Tuple[Tuple[float, float], ...]
+    ra_min: float
+    ra_max: float
+    dec_min: float
+    dec_max: float
+    wide: bool
+
+
+@dataclass(frozen=True)
+class _IauIndex:
+    polygons: Tuple[_IauPolygon, ...]
+    # (banda_dec, bin_ra) -> índices de polígonos, en el orden de load_iau_boundaries
+    cells: Dict[Tuple[int, int], Tuple[int, ...]]
+    n_bands: int
+    n_bins: int
+
+
+def _unwrap_ra(values: List[float]) -> List[float]:
+    """Desenrolla RAs consecutivas para que no salten en el corte 0/360."""
+    out: List[float] = []
+    for ra in values:
+        if not out:
+            out.append(ra)
+            continue
+        d = (ra - out[-1] + 180.0) % 360.0 - 180.0
+        out.append(out[-1] + d)
+    return out
+
+
+def _dec_band(dec: float, n_bands: int) -> int:
+    band = int(math.floor((dec + 90.0) / IAU_INDEX_DEC_BAND_DEG))
+    return max(0, min(n_bands - 1, band))
+
+
+@lru_cache(maxsize=1)
+def _iau_index() -> _IauIndex:
+    """Índice espacial de los límites IAU; se construye una sola vez por proceso."""
+    n_bands = int(math.ceil(180.0 / IAU_INDEX_DEC_BAND_DEG))
+    n_bins = int(math.ceil(360.0 / IAU_INDEX_RA_BIN_DEG))
+    polygons: List[_IauPolygon] = []
+    cells: Dict[Tuple[int, int], List[int]] = {}
+    for name, polys in load_iau_boundaries().items():
+        for poly in polys:
+            ra_u = _unwrap_ra([p[0] for p in poly])
+            decs = [p[1] for p in poly]
+            ra_min, ra_max = min(ra_u), max(ra_u)
+            wide = (ra_max - ra_min) >= 180.0
+            idx = len(polygons)
+            polygons.append(
+                _IauPolygon(
+                    name=name,
+                    vertices=tuple(zip(ra_u, decs)),
+                    ra_min=ra_min,
+                    ra_max=ra_max,
+                    dec_min=min(decs),
+                    dec_max=max(decs),
+                    wide=wide,
+                )
+            )
+            if wide:
+                bins = range(n_bins)
+            else:
+                b0 = int(math.floor(ra_min / IAU_INDEX_RA_BIN_DEG))
+                b1 = int(math.floor(ra_max / IAU_INDEX_RA_BIN_DEG))
+                bins = sorted({b % n_bins for b in range(b0, b1 + 1)})
+            for band in range(_dec_band(min(decs), n_bands), _dec_band(max(decs), n_bands) + 1):
+                for b in bins:
+                    cells.setdefault((band, b), []).append(idx)
+    return _IauIndex(
+        polygons=tuple(polygons),
+        cells={k: tuple(v) for k, v in cells.items()},
+        n_bands=n_bands,
+        n_bins=n_bins,
+    )
+
+
+def _polygon_contains(poly: _IauPolygon, ra: float, dec: float) -> bool:
+    """Test exacto punto-en-polígono; `ra` en [0, 360)."""
+    if dec < poly.dec_min or dec > poly.dec_max:
+        return False
+    if poly.wide:
+        ra_adj = _wrap_ra_to_center([v[0] for v in poly.vertices], ra)
+        return _point_in_polygon_2d(ra, dec, list(zip(ra_adj, [v[1] for v in poly.vertices])))
+    # Fuera de la caja en RA el rayo cruza un número par de aristas.
+    for x in (ra, ra + 360.0, ra - 360.0):
+        if poly.ra_min <= x <= poly.ra_max:
+            return _point_in_polygon_2d(x, dec, list(poly.vertices))
+    return False
+
+
+def _find_constellation_exact(ra: float, dec: float) -> Optional[str]:
+    """Test exacto contra el índice; `ra` en [0, 360) y `dec` ya acotada.
+
+    Solo se prueban los polígonos registrados en la celda del índice que
+    contiene el punto, en el mismo orden que el archivo de límites.
+    """
+    index = _iau_index()
+    band = _dec_band(dec, index.n_bands)
+    ra_bin = int(math.floor(ra / IAU_INDEX_RA_BIN_DEG)) % index.n_bins
+    for idx in index.cells.get((band, ra_bin), ()):
+        poly = index.polygons[idx]
+        if _polygon_contains(poly, ra, dec):
+            return poly.name
+    return None
+
+
 def find_constellation_by_radec(ra_deg: float, dec_deg: float) -> Optional[str]:
     """Devuelve el nombre IAU si el punto cae dentro de algún polígono.
     RA/Dec en grados. Si no hay archivo o no encuentra, retorna None.
+    Consulta primero el ráster de cielo completo; solo las celdas que tocan un
+    límite caen al test exacto de polígonos.
     """
-    boundaries = load_iau_boundaries()
-    if not boundaries:
+    raster = _iau_raster()
+    if not raster.names:
         return None
 
     ra = ra_deg % 360.0
     dec = max(-90.0, min(90.0, float(dec_deg)))
 
-    for name, polys in boundaries.items():
-        for poly in polys:
-            ra_list = [p[0] for p in poly]
-            dec_list = [p[1] for p in poly]
-            ra_adj = _wrap_ra_to_center(ra_list, ra)
-            poly_adj = list(zip(ra_adj, dec_list))
-            if _point_in_polygon_2d(ra, dec, poly_adj):
-                return name
-    return None
+    code = _raster_code(raster, ra, dec)
+    if code == _RASTER_BOUNDARY:
+        return _find_constellation_exact(ra, dec)
+    if code == _RASTER_NONE:
+        return None
+    return raster.names[code]
+
 
+def _points_in_polygon_2d(
+    x: np.ndarray, y: np.ndarray, vx: np.ndarray, vy: np.ndarray
+) -> np.ndarray:
+    """Versión vectorizada de `_point_in_polygon_2d` sobre N puntos.
+
+    `vx`/`vy` son los vértices, de forma (V,) compartidos o (N, V) por punto.
+    """
+    inside = np.zeros(x.shape, dtype=bool)
+    n = vx.shape[-1]
+    for i in range(n):
+        x1, y1 = vx[..., i], vy[..., i]
+        x2, y2 = vx[..., (i + 1) % n], vy[..., (i + 1) % n]
+        intersect = ((y1 > y) != (y2 > y)) & (
+            x < (x2 - x1) * (y - y1) / (y2 - y1 + 1e-12) + x1
+        )
+        inside ^= intersect
+    return inside
+
+
+def _classify_exact(ra: np.ndarray, dec: np.ndarray) -> List[Optional[str]]:
+    """Clasificación exacta en bloque; `ra` en [0, 360) y `dec` ya acotada.
+
+    Recorre los polígonos del índice una sola vez y prueba en bloque los
+    puntos aún sin asignar que caen en su caja envolvente.
+    """
+    out: List[Optional[str]] = [None] * ra.size
+    index = _iau_index()
+    if ra.size == 0 or not index.polygons:
+        return out
+
+    assigned = np.zeros(ra.size, dtype=bool)
+    for poly in index.polygons:
+        cand = ~assigned & (dec >= poly.dec_min) & (dec <= poly.dec_max)
+        if not cand.any():
+            continue
+        vx = np.array([v[0] for v in poly.vertices])
+        vy = np.array([v[1] for v in poly.vertices])
+        rows = np.nonzero(cand)[0]
+        r = ra[rows]
+        d = dec[rows]
+        if poly.wide:
+            # Ajuste por punto, igual que el camino escalar.
+            vx_pt = r[:, None] + (vx[None, :] - r[:, None] + 180.0) % 360.0 - 180.0
+            hit = _points_in_polygon_2d(r, d, vx_pt, np.broadcast_to(vy, vx_pt.shape))
+        else:
+            # Elegir la rama de RA (ra, ra+360, ra-360) que cae en la caja.
+            x = np.full(r.shape, np.nan)
+            for shift in (-360.0, 360.0, 0.0):
+                xs = r + shift
+                x = np.where((xs >= poly.ra_min) & (xs <= poly.ra_max), xs, x)
+            in_box = ~np.isnan(x)
+            hit = np.zeros(r.shape, dtype=bool)
+            if in_box.any():
+                hit[in_box] = _points_in_polygon_2d(x[in_box], d[in_box], vx, vy)
+        for i in rows[hit]:
+            out[i] = poly.name
+        assigned[rows[hit]] = True
+    return out
+
+
+def find_constellations_by_radec(
+    ra_deg: Sequence[float], dec_deg: Sequence[float]
+) -> List[Optional[str]]:
+    """Clasifica N puntos RA/Dec (grados) en su constelación IAU.
+
+    Equivale a llamar `find_constellation_by_radec` por punto: resuelve con el
+    ráster y aplica el test exacto en bloque solo a los puntos de celdas límite.
+    Lanza ValueError si las longitudes difieren o hay valores no finitos.
+    """
+    ra = np.asarray(ra_deg, dtype=float).ravel()
+    dec = np.asarray(dec_deg, dtype=float).ravel()
+    if ra.shape != dec.shape:
+        raise ValueError("ra_deg y dec_deg deben tener la misma longitud")
+    if not (np.isfinite(ra).all() and np.isfinite(dec).all()):
+        raise ValueError("ra_deg y dec_deg deben ser valores finitos")
+    ra = ra % 360.0
+    dec = np.clip(dec, -90.0, 90.0)
+    raster = _iau_raster()
+    if ra.size == 0 or not raster.names:
+        return [None] * ra.size
+
+    codes = raster.codes[_raster_cells(raster, ra, dec)]
+    names = raster.names
+    out: List[Optional[str]] = [names[c] if c >= 0 else None for c in codes.tolist()]
+    boundary = np.nonzero(codes == _RASTER_BOUNDARY)[0]
+    if boundary.size:
+        exact = _classify_exact(ra[boundary], dec[boundary])
+        for i, name in zip(boundary.tolist(), exact):
+            out[i] = name
+    return out
+
+
+# Ráster de cielo completo: bandas de Dec de alto fijo y, en cada banda, un número
+# de celdas de RA proporcional a cos(dec) (celdas de área casi igual).
+IAU_RASTER_CELL_DEG = 0.5
+_RASTER_NONE = -1
+_RASTER_BOUNDARY = -2
+_RASTER_EPS = 1e-9
+
+
+@dataclass(frozen=True)
+class _IauRaster:
+    names: Tuple[str, ...]
+    # Por banda: número de celdas de RA y offset de su primera celda en `codes`
+    band_cells: np.ndarray
+    band_offsets: np.ndarray
+    # Índice en `names`, _RASTER_NONE (fuera de todo polígono) o _RASTER_BOUNDARY
+    codes: np.ndarray
+    # Copias en `array` para la consulta escalar (evita escalares de numpy)
+    band_cells_list: array
+    band_offsets_list: array
+    codes_list: array
+
+
+def _raster_band(dec: float, n_bands: int) -> int:
+    band = int(math.floor((dec + 90.0) / IAU_RASTER_CELL_DEG))
+    return max(0, min(n_bands - 1, band))
+
+
+def _raster_code(raster: _IauRaster, ra: float, dec: float) -> int:
+    band = _raster_band(dec, len(raster.band_cells_list))
+    n = raster.band_cells_list[band]
+    return raster.codes_list[raster.band_offsets_list[band] + min(n - 1, int(ra / 360.0 * n))]
+
+
+def _raster_cells(raster: _IauRaster, ra: np.ndarray, dec: np.ndarray) -> np.ndarray:
+    n_bands = raster.band_cells.size
+    band = np.clip(np.floor((dec + 90.0) / IAU_RASTER_CELL_DEG).astype(np.int64), 0, n_bands - 1)
+    n = raster.band_cells[band]
+    col = np.minimum(n - 1, (ra / 360.0 * n).astype(np.int64))
+    return raster.band_offsets[band] + col
+
+
+def _mark_polygon_edges(
+    poly: _IauPolygon, band_cells: np.ndarray, band_offsets: np.ndarray, boundary: np.ndarray
+) -> None:
+    """Marca (de forma conservadora) las celdas que toca alguna arista del polígono."""
+    n_bands = band_cells.size
+    if poly.wide:
+        # El ajuste por punto mueve las aristas con la consulta: toda la franja es límite.
+        b0 = _raster_band(poly.dec_min, n_bands)
+        b1 = _raster_band(poly.dec_max, n_bands)
+        boundary[band_offsets[b0] : band_offsets[b1] + band_cells[b1]] = True
+        return
+    verts = poly.vertices
+    step = IAU_RASTER_CELL_DEG / 2.0
+    for i in range(len(verts)):
+        (x1, y1), (x2, y2) = verts[i], verts[(i + 1) % len(verts)]
+        k = max(1, int(math.ceil(max(abs(x2 - x1), abs(y2 - y1)) / step)))
+        for j in range(k):
+            # Caja del sub-segmento: cubre todo punto de la arista en ese tramo
+            xa = x1 + (x2 - x1) * j / k
+            xb = x1 + (x2 - x1) * (j + 1) / k
+            ya = y1 + (y2 - y1) * j / k
+            yb = y1 + (y2 - y1) * (j + 1) / k
+            # Holgura _RASTER_EPS: una arista justo sobre el borde de una celda
+            # marca ambas vecinas, a salvo del redondeo.
+            b0 = _raster_band(min(ya, yb) - _RASTER_EPS, n_bands)
+            b1 = _raster_band(max(ya, yb) + _RASTER_EPS, n_bands)
+            for band in range(b0, b1 + 1):
+                n = int(band_cells[band])
+                c0 = int(math.floor(min(xa, xb) / 360.0 * n - _RASTER_EPS))
+                c1 = int(math.floor(max(xa, xb) / 360.0 * n + _RASTER_EPS))
+                for c in range(c0, c1 + 1):
+                    boundary[band_offsets[band] + c % n] = True
+
+
+@lru_cache(maxsize=1)
+def _iau_raster() -> _IauRaster:
+    """Genera (una vez por proceso) el ráster constelación-por-celda.
+
+    Las celdas que no cruza ninguna arista tienen pertenencia constante, así que
+    se clasifican por su centro; las que sí, quedan marcadas para el test exacto.
+    """
+    index = _iau_index()
+    names = tuple(load_iau_boundaries().keys())
+    n_bands = int(math.ceil(180.0 / IAU_RASTER_CELL_DEG))
+    centers_dec = -90.0 + (np.arange(n_bands) + 0.5) * IAU_RASTER_CELL_DEG
+    band_cells = np.maximum(
+        1, np.round(360.0 * np.cos(np.radians(centers_dec)) / IAU_RASTER_CELL_DEG)
+    ).astype(np.int64)
+    band_offsets = np.concatenate(([0], np.cumsum(band_cells)[:-1])).astype(np.int64)
+    total = int(band_cells.sum())
 
+    codes = np.full(total, _RASTER_NONE, dtype=np.int16)
+    if names:
+        cell_band = np.repeat(np.arange(n_bands), band_cells)
+        cell_col = np.arange(total) - band_offsets[cell_band]
+        ra_c = (cell_col + 0.5) * 360.0 / band_cells[cell_band]
+        dec_c = centers_dec[cell_band]
+        code_of = {name: i for i, name in enumerate(names)}
+        for i, name in enumerate(_classify_exact(ra_c, dec_c)):
+            if name is not None:
+                codes[i] = code_of[name]
+        boundary = np.zeros(total, dtype=bool)
+        for poly in index.polygons:
+            _mark_polygon_edges(poly, band_cells, band_offsets, boundary)
+        codes[boundary] = _RASTER_BOUNDARY
+    codes.setflags(write=False)
+    return _IauRaster(
+        names=names,
+        band_cells=band_cells,
+        band_offsets=band_offsets,
+        codes=codes,
+        band_cells_list=array("q", band_cells.tolist()),
+        band_offsets_list=array("q", band_offsets.tolist()),
+        codes_list=array("h", codes.tobytes()),
+    )
@@ -1,8 +1,12 @@
-from typing import List, Optional, Dict
-from fastapi import FastAPI, Query, HTTPException, Request
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Iterator, List, Optional
+from fastapi import FastAPI, Query, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
 from star_service import (
     get_visible_stars,
     compute_visible_stars,
@@ -10,6 +14,8 @@ from star_service import (
     get_astronomy_events,
     get_visible_stars_batch,
     get_visible_bodies_batch,
+    iter_visible_stars_batch,
+    iter_visible_bodies_batch,
     get_constellation_frame,
     get_circumpolar_constellations,
     get_all_constellations_frames,
@@ -17,14 +23,25 @@ from star_service import (
     project_constellations_to_screen,
     get_labels_for_screen,
     resolve_iau_in_fov,
+    get_sky_state,
+    warm_up_ephemeris,
 )
-from iau import find_constellation_by_radec
+from ephemeris import ephemeris_status
+from iau import find_constellation_by_radec, find_constellations_by_radec
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Precarga del kernel de efemérides antes de aceptar tráfico (ver /health)
+    await run_in_threadpool(warm_up_ephemeris)
+    yield
 
 
 app = FastAPI(
     title="Visible Stars API",
     description="Backend con FastAPI para calcular posiciones (alt-az) de estrellas visibles desde una ubicación y fecha/hora dadas",
     version="1.0.0",
+    lifespan=lifespan,
 )
 def _iso_now_z() -> str:
     from datetime import datetime, timezone
@@ -68,7 +85,9 @@ class VisibleStar(BaseModel):
 
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok"}
+    # Las estrellas no dependen del kernel: sin efemérides el servicio queda "degraded"
+    ephemeris = ephemeris_status()
+    return {"status": "ok" if ephemeris["state"] == "ready" else "degraded", "ephemeris": ephemeris}
 
 
 @app.get("/visible-stars", response_model=List[VisibleStar])
@@ -85,6 +104,8 @@ def visible_stars(
     max_mag: Optional[float] = Query(
         None, description="Magnitud visual máxima (menor o igual). Ej: 6.0"
     ),
+    cache_bucket_s: Optional[int] = Query(None, description="Cache por bucket de segundos (opt-in)"),
+    location_tolerance_deg: Optional[float] = Query(None, description="Tolerancia angular (deg) para compartir el cálculo entre ubicaciones cercanas (opt-in)"),
 ) -> List[VisibleStar]:
     stars = get_visible_stars(
         latitude_deg=lat,
@@ -94,6 +115,8 @@ def visible_stars(
         limit=limit,
         sort_by_magnitude=True,
         max_magnitude=max_mag,
+        cache_bucket_s=cache_bucket_s,
+        location_tolerance_deg=location_tolerance_deg,
     )
     # FastAPI/Pydantic realizará la conversión a VisibleStar automáticamente
     return stars
@@ -132,47 +155,11 @@ def constellation_by_direction(
     alt_deg: float = Query(..., description="Altitud (-90..+90)"),
 ):
     """Resuelve a qué constelación (IAU) corresponde una dirección alt-az dada."""
-    from skyfield.api import load, wgs84
+    from star_service import _horizontal_to_equatorial, _lst_hours, _parse_iso_datetime_utc
 
-    # Convert alt-az a RA/Dec usando Skyfield
-    ts = load.timescale()
-    import math
-    from datetime import datetime, timezone
-    if at is None:
-        t = ts.from_datetime(datetime.now(timezone.utc))
-    else:
-        # Reusar parser robusto desde star_service si se desea, pero aquí aceptamos ISO directo
-        s = at.strip()
-        if s.endswith("Z"):
-            s = s[:-1] + "+00:00"
-        t = ts.from_datetime(datetime.fromisoformat(s))
-
-    observer = wgs84.latlon(latitude_degrees=float(lat), longitude_degrees=float(lon))
-    # Skyfield no ofrece inverso alt-az->RA/Dec directo; aproximamos buscando la dirección
-    # creamos un vector dirección a partir de alt-az en el sistema local y lo convertimos a RA/Dec con frame local.
-    # Para simplificar, sampleamos cercana a esa dirección via astrometric of small angular displacement.
-    # Alternativa simple: usar geometría esférica local -> ecuatorial.
-
-    # Transformación aproximada: a partir de LST y lat.
-    from star_service import _lst_hours, _deg_to_rad, _rad_to_deg
-    from datetime import datetime as _dt
-    dt = _dt.utcnow().replace(tzinfo=timezone.utc) if at is None else _dt.fromisoformat(s)
-    lst_h = _lst_hours(lon, dt)
-    lst_rad = math.radians(lst_h * 15.0)
-    lat_rad = math.radians(lat)
-    alt_rad = math.radians(alt_deg)
-    az_rad = math.radians(az_deg)
-
-    # Inversa de horizontal->ecuatorial
-    sin_dec = math.sin(alt_rad) * math.sin(lat_rad) + math.cos(alt_rad) * math.cos(lat_rad) * math.cos(az_rad)
-    dec_rad = math.asin(max(-1.0, min(1.0, sin_dec)))
-    cos_dec = max(1e-9, math.cos(dec_rad))
-    sin_ha = -math.sin(az_rad) * math.cos(alt_rad) / cos_dec
-    cos_ha = (math.sin(alt_rad) - math.sin(lat_rad) * math.sin(dec_rad)) / (math.cos(lat_rad) * cos_dec)
-    ha_rad = math.atan2(sin_ha, cos_ha)
-    ra_rad = (lst_rad - ha_rad) % (2.0 * math.pi)
-    ra_deg = math.degrees(ra_rad)
-    dec_deg = math.degrees(dec_rad)
+    # El parseo de `at` comparte el caché LRU de star_service.
+    dt = _parse_iso_datetime_utc(at)
+    ra_deg, dec_deg = _horizontal_to_equatorial(alt_deg, az_deg, lat, _lst_hours(lon, dt))
 
     name = find_constellation_by_radec(ra_deg, dec_deg)
     return {
@@ -183,6 +170,18 @@ def constellation_by_direction(
     }
 
 
+class RaDecBatch(BaseModel):
+    ra_deg: List[float]
+    dec_deg: List[float]
+
+
+@app.post("/constellations-by-radec")
+def constellations_by_radec(body: RaDecBatch):
+    """Clasifica en bloque puntos RA/Dec (grados) en su constelación IAU."""
+    names = find_constellations_by_radec(body.ra_deg, body.dec_deg)
+    return {"count": len(names), "iau_constellations": names}
+
+
 @app.get("/visible-bodies", response_model=List[VisibleBody])
 def visible_bodies(
     lat: float = Query(..., description="Latitud del observador en grados (sur negativo)"),
@@ -191,6 +190,8 @@ def visible_bodies(
         None,
         description="Fecha/hora en formato ISO 8601 (UTC). Ej: 2024-01-01T02:30:00Z. Si se omite, se usa la hora actual en UTC.",
     ),
+    cache_bucket_s: Optional[int] = Query(None, description="Cache por bucket de segundos (opt-in)"),
+    location_tolerance_deg: Optional[float] = Query(None, description="Tolerancia angular (deg) para compartir el cálculo entre ubicaciones cercanas (opt-in)"),
 ) -> List[VisibleBody]:
     try:
         bodies = get_visible_bodies(
@@ -198,6 +199,8 @@ def visible_bodies(
             longitude_deg=lon,
             when_iso_utc=at,
             minimum_altitude_deg=-90.0,
+            cache_bucket_s=cache_bucket_s,
+            location_tolerance_deg=location_tolerance_deg,
         )
         return bodies
     except Exception:
@@ -255,6 +258,81 @@ def visible_stars_batch(
         return {"frames": []}
 
 
+def _stream_frames(frames: Iterator[Dict[str, object]], fmt: str) -> StreamingResponse:
+    """Emite cada frame apenas se calcula: NDJSON (una línea JSON por frame) o SSE.
+
+    Un error a mitad de stream se emite como registro/evento `error` y cierra el stream.
+    """
+    if fmt not in ("ndjson", "sse"):
+        raise HTTPException(status_code=422, detail="format debe ser 'ndjson' o 'sse'")
+
+    def encode(kind: str, payload: Dict[str, object]) -> str:
+        if fmt == "sse":
+            return f"event: {kind}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+        if kind != "frame":
+            payload = {kind: payload}
+        return json.dumps(payload, separators=(",", ":")) + "\n"
+
+    def body() -> Iterator[str]:
+        try:
+            for frame in frames:
+                yield encode("frame", frame)
+        except Exception as e:
+            yield encode("error", {"detail": str(e)})
+            return
+        if fmt == "sse":
+            yield encode("end", {})
+
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/visible-stars-stream")
+def visible_stars_stream(
+    lat: float = Query(..., description="Latitud del observador en grados (sur negativo)"),
+    lon: float = Query(..., description="Longitud del observador en grados (oeste negativo)"),
+    start: str = Query(..., description="Inicio (ISO 8601 UTC, ej: 2025-08-11T18:00:00Z)"),
+    end: str = Query(..., description="Fin (ISO 8601 UTC, ej: 2025-08-12T06:00:00Z)"),
+    step_hours: float = Query(1.0, description="Paso en horas entre frames"),
+    max_mag: Optional[float] = Query(None, description="Magnitud visual máxima (menor o igual). Ej: 6.0"),
+    limit: Optional[int] = Query(None, description="Límite por frame"),
+    format: str = Query("ndjson", description="'ndjson' (una línea por frame) o 'sse' (Server-Sent Events)"),
+):
+    """Como `/visible-stars-batch`, pero transmite cada frame al calcularlo."""
+    frames = iter_visible_stars_batch(
+        latitude_deg=lat,
+        longitude_deg=lon,
+        start_iso_utc=start,
+        end_iso_utc=end,
+        step_hours=step_hours,
+        max_magnitude=max_mag,
+        limit=limit,
+    )
+    return _stream_frames(frames, format)
+
+
+@app.get("/visible-bodies-stream")
+def visible_bodies_stream(
+    lat: float = Query(..., description="Latitud del observador en grados (sur negativo)"),
+    lon: float = Query(..., description="Longitud del observador en grados (oeste negativo)"),
+    start: str = Query(..., description="Inicio (ISO 8601 UTC, ej: 2025-08-11T18:00:00Z)"),
+    end: str = Query(..., description="Fin (ISO 8601 UTC, ej: 2025-08-12T06:00:00Z)"),
+    step_hours: float = Query(1.0, description="Paso en horas entre frames"),
+    limit: Optional[int] = Query(None, description="Límite por frame"),
+    format: str = Query("ndjson", description="'ndjson' (una línea por frame) o 'sse' (Server-Sent Events)"),
+):
+    """Como `/visible-bodies-batch`, pero transmite cada frame al calcularlo."""
+    frames = iter_visible_bodies_batch(
+        latitude_deg=lat,
+        longitude_deg=lon,
+        start_iso_utc=start,
+        end_iso_utc=end,
+        step_hours=step_hours,
+        limit=limit,
+    )
+    return _stream_frames(frames, format)
+
+
 @app.get("/constellations-visible")
 def constellations_visible(
     lat: float = Query(..., description="Latitud del observador"),
@@ -302,6 +380,7 @@ def constellations_screen(
     heading_offset_deg: float = Query(0.0, description="Corrección de brújula (deg)"),
     roll_deg: float = Query(0.0, description="Rotación de pantalla (roll, deg)"),
     cache_bucket_s: Optional[int] = Query(1, description="Cache por bucket de segundos (modo AR: 1, educativo: 2)"),
+    location_tolerance_deg: Optional[float] = Query(None, description="Tolerancia angular (deg) de la celda de ubicación del caché (def 0.01)"),
     yaw_deg: Optional[float] = Query(None, description="Orientación yaw/heading (deg)"),
     pitch_deg: Optional[float] = Query(None, description="Orientación pitch (deg)"),
     pitch_offset_deg: float = Query(0.0, description="Corrección de pitch (deg)"),
@@ -343,6 +422,7 @@ def constellations_screen(
         heading_offset_deg=heading_offset_deg,
         roll_deg=roll_deg,
         cache_bucket_s=cache_bucket_s,
+        location_tolerance_deg=location_tolerance_deg,
     )
     return {"at": at or "now", "frames": frames}
 
@@ -367,6 +447,7 @@ def constellations_labels(
     max_mag: float = Query(4.0, description="Magnitud máxima para etiquetar"),
     min_separation_px: float = Query(24.0, description="Separación mínima entre labels (px)"),
     cache_bucket_s: Optional[int] = Query(1, description="Cache por bucket de segundos (modo AR: 1, educativo: 2)"),
+    location_tolerance_deg: Optional[float] = Query(None, description="Tolerancia angular (deg) de la celda de ubicación del caché (def 0.01)"),
 ):
     labels = get_labels_for_screen(
         latitude_deg=lat,
@@ -387,10 +468,141 @@ def constellations_labels(
         max_mag=max_mag,
         min_separation_px=min_separation_px,
         cache_bucket_s=cache_bucket_s,
+        location_tolerance_deg=location_tolerance_deg,
     )
     return {"at": at or "now", "labels": labels}
 
 
+class ArStreamSession(BaseModel):
+    """Parámetros fijos de una sesión AR por WebSocket (se validan una sola vez).
+
+    Los valores que el servicio rechazaría en cada frame (FOV o pantalla no
+    positivos, tolerancia <= 0, `max_labels` negativo) se rechazan al abrir.
+    """
+
+    lat: float
+    lon: float
+    fov_h_deg: float = Field(..., gt=0)
+    fov_v_deg: float = Field(..., gt=0)
+    width_px: int = Field(..., gt=0)
+    height_px: int = Field(..., gt=0)
+    names: Optional[List[str]] = None
+    min_alt: float = 0.0
+    include_below_horizon: bool = False
+    include_offscreen: bool = False
+    clip_edges_to_fov: bool = True
+    heading_offset_deg: float = 0.0
+    pitch_offset_deg: float = 0.0
+    labels: bool = True
+    max_labels: int = Field(20, ge=0)
+    max_mag: float = 4.0
+    min_separation_px: float = Field(24.0, ge=0)
+    cache_bucket_s: int = Field(1, ge=0)
+    location_tolerance_deg: Optional[float] = Field(None, gt=0)
+
+
+class _ArStreamState:
+    """Sesión abierta: parámetros + estado de cielo reutilizado entre mensajes."""
+
+    def __init__(self, params: ArStreamSession) -> None:
+        self.params = params
+        self._sky_key: Optional[tuple] = None
+        self._sky_state = None
+
+    def sky_state(self, at: Optional[str]):
+        p = self.params
+        bucket = max(1, int(p.cache_bucket_s))
+        # Sin `at` explícito basta comparar el índice de bucket: no se re-parsea ni se cuantiza
+        key = (at, None if at else int(time.time() // bucket))
+        if key != self._sky_key:
+            self._sky_state = get_sky_state(p.lat, p.lon, at, p.location_tolerance_deg, bucket)
+            self._sky_key = key
+        return self._sky_state
+
+    def frame(self, pose: Dict[str, object]) -> Dict[str, object]:
+        p = self.params
+        at = pose.get("at")
+        at = str(at) if at else None
+        az_center = (float(pose.get("yaw_deg", 0.0)) + p.heading_offset_deg) % 360.0
+        alt_center = max(-90.0, min(90.0, float(pose.get("pitch_deg", 0.0)) + p.pitch_offset_deg))
+        roll = float(pose.get("roll_deg", 0.0))
+        state = self.sky_state(at)
+        common = dict(
+            latitude_deg=p.lat,
+            longitude_deg=p.lon,
+            when_iso_utc=at,
+            minimum_altitude_deg=p.min_alt,
+            names=p.names,
+            include_below_horizon=p.include_below_horizon,
+            fov_center_az_deg=az_center,
+            fov_center_alt_deg=alt_center,
+            fov_h_deg=p.fov_h_deg,
+            fov_v_deg=p.fov_v_deg,
+            width_px=p.width_px,
+            height_px=p.height_px,
+            heading_offset_deg=p.heading_offset_deg,
+            roll_deg=roll,
+            sky_state=state,
+        )
+        out: Dict[str, object] = {
+            "type": "frame",
+            "at": at or state.when_iso_utc,
+            "frames": project_constellations_to_screen(
+                include_offscreen=p.include_offscreen,
+                clip_edges_to_fov=p.clip_edges_to_fov,
+                **common,
+            ),
+        }
+        if p.labels:
+            out["labels"] = get_labels_for_screen(
+                max_labels=p.max_labels,
+                max_mag=p.max_mag,
+                min_separation_px=p.min_separation_px,
+                **common,
+            )
+        return out
+
+
+@app.websocket("/ws/ar")
+async def ar_stream(websocket: WebSocket):
+    """Stream AR: el cliente abre sesión una vez y luego solo envía orientación.
+
+    Mensajes del cliente (JSON):
+    - `{"type": "session", lat, lon, fov_h_deg, fov_v_deg, width_px, height_px, ...}`
+      (mismos parámetros que `/constellations-screen` y `/constellations-labels`)
+    - `{"yaw_deg", "pitch_deg", "roll_deg"?, "at"?}` -> responde `{type: "frame", at, frames, labels?}`
+    Los errores se responden como `{type: "error", detail}` sin cerrar la conexión.
+    """
+    await websocket.accept()
+    session: Optional[_ArStreamState] = None
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                msg = json.loads(text)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": f"JSON inválido: {e}"})
+                continue
+            if not isinstance(msg, dict):
+                await websocket.send_json({"type": "error", "detail": "Se espera un objeto JSON"})
+                continue
+            try:
+                if msg.get("type") == "session":
+                    params = ArStreamSession(**{k: v for k, v in msg.items() if k != "type"})
+                    session = _ArStreamState(params)
+                    await websocket.send_json({"type": "session", "ok": True})
+                    continue
+                if session is None:
+                    await websocket.send_json({"type": "error", "detail": "Abra la sesión primero (type: session)"})
+                    continue
+                # El cálculo es CPU: fuera del event loop, como los endpoints síncronos
+                await websocket.send_json(await run_in_threadpool(session.frame, msg))
+            except (ValidationError, ValueError, TypeError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        return
+
+
 @app.get("/iau-in-fov")
 def iau_in_fov(
     lat: float = Query(..., description="Latitud"),
@@ -470,6 +682,8 @@ def constellation_frame(
     lon: float = Query(..., description="Longitud del observador"),
     at: Optional[str] = Query(None, description="Fecha/hora ISO 8601 UTC (Z)"),
     min_alt: float = Query(0.0, description="Altitud mínima (grados). 0 = sobre horizonte"),
+    cache_bucket_s: Optional[int] = Query(None, description="Cache por bucket de segundos (opt-in)"),
+    location_tolerance_deg: Optional[float] = Query(None, description="Tolerancia angular (deg) para compartir el cálculo entre ubicaciones cercanas (opt-in)"),
 ):
     try:
         frame = get_constellation_frame(
@@ -478,6 +692,8 @@ def constellation_frame(
             longitude_deg=lon,
             when_iso_utc=at,
             minimum_altitude_deg=min_alt,
+            cache_bucket_s=cache_bucket_s,
+            location_tolerance_deg=location_tolerance_deg,
         )
         return frame
     except Exception as e:
@@ -498,6 +714,7 @@ def constellations_frames(
     fov_v_deg: Optional[float] = Query(None, description="Alto FOV (deg)"),
     clip_edges_to_fov: bool = Query(False, description="Recortar edges al FOV"),
     cache_bucket_s: Optional[int] = Query(1, description="Cache por bucket de segundos (modo AR: 1, educativo: 2)"),
+    location_tolerance_deg: Optional[float] = Query(None, description="Tolerancia angular (deg) de la celda de ubicación del caché (def 0.01)"),
     dim_below_horizon: bool = Query(True, description="Sugerir estilo tenue para constelaciones bajo el horizonte"),
 ):
     try:
@@ -514,6 +731,7 @@ def constellations_frames(
             fov_v_deg=fov_v_deg,
             clip_edges_to_fov=clip_edges_to_fov,
             cache_bucket_s=cache_bucket_s,
+            location_tolerance_deg=location_tolerance_deg,
         )
         # Anotar estilo sugerido según visibilidad
         if dim_below_horizon:
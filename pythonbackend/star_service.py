@@ -1,34 +1,29 @@
 from __future__ import annotations
 
+import itertools
 import json
 import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from datetime import timedelta
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 # Skyfield para cálculos astronómicos de alta precisión
 from skyfield.api import Star, load, wgs84
+from skyfield.units import Angle
+from skyfield.constants import AU_KM
 from skyfield import almanac
+from catalog import CatalogStar, StarCatalog, load_binary_catalog
+from ephemeris import SERVICE_BODY_KEYS, load_ephemeris, warm_up
 from constellations import get_constellation_definition, list_constellations
-from iau import get_iau_constellation_centroids
-
-
-@dataclass
-class CatalogStar:
-    name: str
-    ra_hours: float  # Ascensión recta en horas
-    dec_deg: float   # Declinación en grados
-    magnitude: float
-    # Campos opcionales enriquecidos (si existen en el catálogo)
-    distance_ly: Optional[float] = None
-    color_temp_K: Optional[float] = None
-    bv: Optional[float] = None
-    rgb_hex: Optional[str] = None
-    aliases: Optional[List[str]] = None
-    ids: Optional[Dict[str, int]] = None
+from iau import find_constellation_by_radec, get_iau_constellation_centroids
 
 
 def _module_dir() -> Path:
@@ -39,36 +34,29 @@ def _catalog_path() -> Path:
     return _module_dir() / "star_catalog.json"
 
 
+def _catalog_bin_path() -> Path:
+    return _module_dir() / "star_catalog.bin"
+
+
 @lru_cache(maxsize=1)
-def load_star_catalog() -> List[CatalogStar]:
+def load_star_catalog() -> StarCatalog:
+    """Carga el catálogo en formato columnar (ver `catalog.StarCatalog`).
+
+    Usa `star_catalog.bin` (compilado con `python catalog.py`) vía mmap si existe y
+    está al día respecto al JSON; si no, parsea `star_catalog.json`.
+    Sigue siendo iterable/indexable como lista de `CatalogStar` para compatibilidad.
+    """
     path = _catalog_path()
+    bin_path = _catalog_bin_path()
+    if bin_path.exists():
+        try:
+            return load_binary_catalog(bin_path, source_path=path)
+        except (OSError, ValueError):
+            # Binario ausente/incompatible/desactualizado: recurrir al JSON
+            pass
     with path.open("r", encoding="utf-8") as f:
         raw = json.load(f)
-    stars: List[CatalogStar] = []
-    for item in raw:
-        # Aceptar ambos esquemas: nuevo (ra, dec, mag) y anterior (ra_hours, dec_deg, magnitude)
-        ra_value = item.get("ra", item.get("ra_hours"))
-        dec_value = item.get("dec", item.get("dec_deg"))
-        mag_value = item.get("mag", item.get("magnitude"))
-
-        if ra_value is None or dec_value is None or mag_value is None or "name" not in item:
-            raise ValueError("Entrada de catálogo inválida: se requieren name, y ra/ra_hours, dec/dec_deg, mag/magnitude")
-
-        stars.append(
-            CatalogStar(
-                name=str(item["name"]),
-                ra_hours=float(ra_value),
-                dec_deg=float(dec_value),
-                magnitude=float(mag_value),
-                distance_ly=(float(item["distance_ly"]) if "distance_ly" in item and item["distance_ly"] is not None else None),
-                color_temp_K=(float(item["color_temp_K"]) if "color_temp_K" in item and item["color_temp_K"] is not None else None),
-                bv=(float(item["bv"]) if "bv" in item and item["bv"] is not None else None),
-                rgb_hex=(str(item["rgb_hex"]) if "rgb_hex" in item and item["rgb_hex"] is not None else None),
-                aliases=(list(item["aliases"]) if "aliases" in item and item["aliases"] is not None else None),
-                ids=(dict(item["ids"]) if "ids" in item and item["ids"] is not None else None),
-            )
-        )
-    return stars
+    return StarCatalog.from_records(raw)
 
 
 def _normalize_hours(hours: float) -> float:
@@ -152,9 +140,36 @@ def _lst_hours(longitude_deg: float, dt: datetime) -> float:
     return _normalize_hours(_gmst_hours(dt) + longitude_deg / 15.0)
 
 
-def _parse_iso_datetime_utc(when_iso_utc: Optional[str]) -> datetime:
-    if not when_iso_utc:
-        return datetime.now(timezone.utc)
+def _horizontal_to_equatorial(
+    altitude_deg: float, azimuth_deg: float, latitude_deg: float, lst_hours: float
+) -> Tuple[float, float]:
+    """Inversa de horizontal->ecuatorial (geometría esférica local). Devuelve (RA deg, Dec deg).
+
+    Skyfield no ofrece inverso alt-az->RA/Dec directo.
+    """
+    lst_rad = math.radians(lst_hours * 15.0)
+    lat_rad = math.radians(latitude_deg)
+    alt_rad = math.radians(altitude_deg)
+    az_rad = math.radians(azimuth_deg)
+
+    sin_dec = math.sin(alt_rad) * math.sin(lat_rad) + math.cos(alt_rad) * math.cos(lat_rad) * math.cos(az_rad)
+    dec_rad = math.asin(max(-1.0, min(1.0, sin_dec)))
+    cos_dec = max(1e-9, math.cos(dec_rad))
+    sin_ha = -math.sin(az_rad) * math.cos(alt_rad) / cos_dec
+    cos_ha = (math.sin(alt_rad) - math.sin(lat_rad) * math.sin(dec_rad)) / (math.cos(lat_rad) * cos_dec)
+    ha_rad = math.atan2(sin_ha, cos_ha)
+    ra_rad = (lst_rad - ha_rad) % (2.0 * math.pi)
+    return math.degrees(ra_rad), math.degrees(dec_rad)
+
+
+@lru_cache(maxsize=1)
+def _timescale():
+    """Timescale de Skyfield compartido por todo el proceso."""
+    return load.timescale()
+
+
+@lru_cache(maxsize=256)
+def _parse_iso_cached(when_iso_utc: str) -> Tuple[datetime, object]:
     s = when_iso_utc.strip()
     if s.endswith("Z"):
         s = s[:-1] + "+00:00"
@@ -168,7 +183,25 @@ def _parse_iso_datetime_utc(when_iso_utc: Optional[str]) -> datetime:
         dt = dt.replace(tzinfo=timezone.utc)
     else:
         dt = dt.astimezone(timezone.utc)
-    return dt
+    return dt, _timescale().from_datetime(dt)
+
+
+def _parse_iso_time_utc(when_iso_utc: Optional[str]) -> Tuple[datetime, object]:
+    """Devuelve (datetime UTC, skyfield Time) para el string `at` recibido.
+
+    Los strings explícitos se memorizan en un LRU (los clientes AR repiten el mismo
+    `at` muchas veces); None/vacío significa ahora y no se cachea.
+    """
+    if not when_iso_utc:
+        dt = datetime.now(timezone.utc)
+        return dt, _timescale().from_datetime(dt)
+    return _parse_iso_cached(when_iso_utc)
+
+
+def _parse_iso_datetime_utc(when_iso_utc: Optional[str]) -> datetime:
+    if not when_iso_utc:
+        return datetime.now(timezone.utc)
+    return _parse_iso_cached(when_iso_utc)[0]
 
 
 def _equatorial_to_horizontal(
@@ -196,12 +229,78 @@ def _equatorial_to_horizontal(
     return {"altitude_deg": alt_deg, "azimuth_deg": az_deg}
 
 
+def _equatorial_to_horizontal_array(
+    ra_hours: np.ndarray, dec_deg: np.ndarray, latitude_deg: float, lst_hours
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Versión vectorizada de `_equatorial_to_horizontal` sobre arrays de RA/Dec.
+
+    Devuelve (altitude_deg, azimuth_deg) con la forma de la entrada. `lst_hours`
+    puede ser un escalar o un array (T, 1): en ese caso el resultado es una
+    matriz (tiempo x estrella).
+    """
+    ra_rad = np.radians(ra_hours * 15.0)
+    dec_rad = np.radians(dec_deg)
+    lat_rad = math.radians(latitude_deg)
+    lst_rad = np.radians(np.asarray(lst_hours, dtype=np.float64) * 15.0)
+
+    ha_rad = lst_rad - ra_rad
+    sin_dec = np.sin(dec_rad)
+    cos_dec = np.cos(dec_rad)
+    sin_lat = math.sin(lat_rad)
+    cos_lat = math.cos(lat_rad)
+
+    sin_alt = sin_dec * sin_lat + cos_dec * cos_lat * np.cos(ha_rad)
+    alt_rad = np.arcsin(np.clip(sin_alt, -1.0, 1.0))
+
+    cos_alt = np.maximum(1e-9, np.cos(alt_rad))  # evitar divisiones por cero en el zenit
+    sin_az = -cos_dec * np.sin(ha_rad) / cos_alt
+    cos_az = (sin_dec - np.sin(alt_rad) * sin_lat) / (cos_alt * cos_lat)
+    az_rad = np.arctan2(sin_az, cos_az)
+
+    return np.degrees(alt_rad), np.degrees(az_rad) % 360.0
+
+
+def _star_result_item(star: CatalogStar, altitude_deg: float, azimuth_deg: float) -> Dict[str, float]:
+    item: Dict[str, float] = {
+        "name": star.name,
+        "magnitude": star.magnitude,
+        "altitude_deg": altitude_deg,
+        "azimuth_deg": azimuth_deg,
+    }
+    # Campos opcionales si existen
+    if star.distance_ly is not None:
+        item["distance_ly"] = star.distance_ly
+    if star.color_temp_K is not None:
+        item["color_temp_K"] = star.color_temp_K
+    if star.bv is not None:
+        item["bv"] = star.bv
+    if star.rgb_hex is not None:
+        item["rgb_hex"] = star.rgb_hex
+    if star.aliases is not None:
+        item["aliases"] = star.aliases
+    if star.ids is not None:
+        item["ids"] = star.ids
+    return item
+
+
 # ------------------------- Cuerpos del Sistema Solar -------------------------
 
-@lru_cache(maxsize=1)
 def _load_ephemeris():
-    # Kernel estándar relativamente liviano
-    return load("de421.bsp")
+    # Kernel mapeado de solo lectura y validado (ver `ephemeris.load_ephemeris`)
+    return load_ephemeris()
+
+
+def _topocentric_observer(latitude_deg: float, longitude_deg: float):
+    """Observador topocéntrico anclado a la Tierra (requerido por `observe`)."""
+    eph = _load_ephemeris()
+    return eph["earth"] + wgs84.latlon(latitude_degrees=float(latitude_deg), longitude_degrees=float(longitude_deg))
+
+
+@lru_cache(maxsize=1)
+def _catalog_skyfield_star() -> Star:
+    """`Star` de Skyfield con valores array para todo el catálogo (cacheado entre requests)."""
+    catalog = load_star_catalog()
+    return Star(ra_hours=np.array(catalog.ra_hours), dec_degrees=np.array(catalog.dec_deg))
 
 
 def _planet_magnitude(planet_name: str, r_au: float, delta_au: float, phase_angle_deg: float) -> Optional[float]:
@@ -256,101 +355,321 @@ def get_visible_bodies(
     longitude_deg: float,
     when_iso_utc: Optional[str] = None,
     minimum_altitude_deg: float = -90.0,
+    location_tolerance_deg: Optional[float] = None,
+    cache_bucket_s: Optional[int] = None,
+    use_body_table: bool = True,
 ) -> List[Dict[str, float]]:
     """
     Calcula posiciones (alt-az) de cuerpos brillantes del Sistema Solar y devuelve
     una lista con dicts: {name, type, magnitude?, altitude_deg, azimuth_deg, phase?, distance_km?, distance_au?}.
+
+    Con `location_tolerance_deg` o `cache_bucket_s` se lee del estado de cielo
+    compartido por celda de ubicación y bucket de tiempo (ver `get_sky_state`).
+    Si el instante cae en la tabla de efemérides precalculada (días alrededor de
+    ahora) se interpola de ella (tolerancia: `BODY_TABLE_TOLERANCE_ARCSEC`);
+    `use_body_table=False` fuerza el cálculo completo con Skyfield.
+    """
+    if _sky_state_requested(location_tolerance_deg, cache_bucket_s):
+        state = get_sky_state(latitude_deg, longitude_deg, when_iso_utc, location_tolerance_deg, cache_bucket_s)
+        return [dict(b) for b in state.bodies() if float(b["altitude_deg"]) >= minimum_altitude_deg]
+
+    _dt_utc, t = _parse_iso_time_utc(when_iso_utc)
+    return _compute_visible_bodies(latitude_deg, longitude_deg, t, minimum_altitude_deg, use_body_table)
+
+
+# (nombre público, clave en la efeméride) de los planetas reportados
+_PLANET_BODIES: Tuple[Tuple[str, str], ...] = (
+    ("Mercury", "mercury"),
+    ("Venus", "venus"),
+    ("Mars", "mars"),
+    ("Jupiter", "jupiter barycenter"),
+    ("Saturn", "saturn barycenter"),
+    ("Uranus", "uranus barycenter"),
+    ("Neptune", "neptune barycenter"),
+)
+
+
+class _BodyGeometry:
+    """Geometría compartida de un request para los cuerpos del Sistema Solar.
+
+    El observador, la Tierra y el Sol se evalúan una sola vez (con `t` escalar o
+    array). Por cuerpo basta una observación topocéntrica: su posición en el
+    instante de emisión da, con esos vectores, las distancias geocéntrica y
+    heliocéntrica y el ángulo de fase. Frente a observar por separado desde la
+    Tierra y el Sol (tiempos de luz distintos) la diferencia es < 1e-4 AU y
+    < 0.001° de fase (< 0.001 mag); alt/az y distancia topocéntrica no cambian.
     """
-    dt_utc = _parse_iso_datetime_utc(when_iso_utc)
-    ts = load.timescale()
-    t = ts.from_datetime(dt_utc)
 
-    eph = _load_ephemeris()
+    def __init__(self, latitude_deg: float, longitude_deg: float, t) -> None:
+        self.eph = _load_ephemeris()
+        self.t = t
+        self.observer_at = _topocentric_observer(latitude_deg, longitude_deg).at(t)
+        self.earth_au = self.eph["earth"].at(t).position.au
+        self.sun_au = self.eph["sun"].at(t).position.au
+
+    def apparent(self, body):
+        return self.observer_at.observe(body).apparent()
+
+    def observe(self, body):
+        """(apparent, distancia geocéntrica AU, heliocéntrica AU, ángulo de fase deg)."""
+        astrometric = self.observer_at.observe(body)
+        body_au = self.observer_at.position.au + astrometric.position.au
+        to_earth = self.earth_au - body_au
+        to_sun = self.sun_au - body_au
+        geo = np.sqrt(np.sum(to_earth * to_earth, axis=0))
+        helio = np.sqrt(np.sum(to_sun * to_sun, axis=0))
+        cos_phase = np.sum(to_earth * to_sun, axis=0) / (geo * helio)
+        phase = np.degrees(np.arccos(np.clip(cos_phase, -1.0, 1.0)))
+        return astrometric.apparent(), geo, helio, phase
+
+
+def _compute_visible_bodies(
+    latitude_deg: float,
+    longitude_deg: float,
+    t,
+    minimum_altitude_deg: float = -90.0,
+    use_body_table: bool = True,
+) -> List[Dict[str, float]]:
+    if use_body_table:
+        table = _body_table_for(t)
+        if table is not None:
+            return _compute_visible_bodies_from_table(table, latitude_deg, longitude_deg, t, minimum_altitude_deg)
+    return _compute_visible_bodies_series(latitude_deg, longitude_deg, t, minimum_altitude_deg)[0]
+
+
+def _body_item(
+    name: str,
+    altitude_deg: float,
+    azimuth_deg: float,
+    distance_au: float,
+    geo_au: float = 0.0,
+    helio_au: float = 0.0,
+    phase_angle_deg: float = 0.0,
+) -> Dict[str, float]:
+    """Dict de salida de un cuerpo (`distance_au` es la distancia topocéntrica)."""
+    if name == "Sun":
+        return {
+            "name": "Sun",
+            "type": "sun",
+            "magnitude": -26.74,
+            "altitude_deg": altitude_deg,
+            "azimuth_deg": azimuth_deg % 360.0,
+            "distance_au": distance_au,
+        }
+    if name == "Moon":
+        # Fracción iluminada (0..1) derivada del ángulo de fase, como `almanac.fraction_illuminated`
+        distance_km = distance_au * AU_KM
+        return {
+            "name": "Moon",
+            "type": "moon",
+            "magnitude": _moon_magnitude(phase_angle_deg=phase_angle_deg, delta_km=distance_km),
+            "altitude_deg": altitude_deg,
+            "azimuth_deg": azimuth_deg % 360.0,
+            "phase": 0.5 * (1.0 + math.cos(math.radians(phase_angle_deg))),
+            "distance_km": distance_km,
+        }
+    item: Dict[str, float] = {
+        "name": name,
+        "type": "planet",
+        "altitude_deg": altitude_deg,
+        "azimuth_deg": azimuth_deg % 360.0,
+        "distance_au": distance_au,
+    }
+    magnitude = _planet_magnitude(name.lower(), helio_au, geo_au, phase_angle_deg)
+    if magnitude is not None:
+        item["magnitude"] = magnitude
+    return item
 
-    observer = wgs84.latlon(latitude_degrees=float(latitude_deg), longitude_degrees=float(longitude_deg))
 
-    results: List[Dict[str, float]] = []
+def _sort_bodies(results: List[Dict[str, float]]) -> List[Dict[str, float]]:
+    # Ordenar por altitud descendente
+    results.sort(key=lambda x: x.get("altitude_deg", -1e9), reverse=True)
+    return results
 
-    bodies_planets = [
-        ("Mercury", "planet", eph["mercury"]),
-        ("Venus", "planet", eph["venus"]),
-        ("Mars", "planet", eph["mars"]),
-        ("Jupiter", "planet", eph["jupiter barycenter"]),
-        ("Saturn", "planet", eph["saturn barycenter"]),
-        ("Uranus", "planet", eph["uranus barycenter"]),
-        ("Neptune", "planet", eph["neptune barycenter"]),
-    ]
 
-    # Sol
-    sun_app = observer.at(t).observe(eph["sun"]).apparent()
-    sun_alt, sun_az, sun_dist = sun_app.altaz()
-    if float(sun_alt.degrees) >= minimum_altitude_deg:
-        results.append(
-            {
-                "name": "Sun",
-                "type": "sun",
-                "magnitude": -26.74,
-                "altitude_deg": float(sun_alt.degrees),
-                "azimuth_deg": float(sun_az.degrees) % 360.0,
-                "distance_au": float(sun_dist.au),
-            }
-        )
+def _compute_visible_bodies_series(
+    latitude_deg: float,
+    longitude_deg: float,
+    t,
+    minimum_altitude_deg: float = -90.0,
+) -> List[List[Dict[str, float]]]:
+    """Cuerpos visibles para un `Time` de Skyfield escalar o array (camino completo).
 
-    # Luna
-    moon_app = observer.at(t).observe(eph["moon"]).apparent()
-    moon_alt, moon_az, moon_dist = moon_app.altaz()
-    if float(moon_alt.degrees) >= minimum_altitude_deg:
-        # Fase (fracción iluminada 0..1) y ángulo de fase en grados
-        frac = float(almanac.fraction_illuminated(eph, "moon", t))
-        phase_angle = float(almanac.phase_angle(eph, "moon", t).degrees)
-        mag_moon = _moon_magnitude(phase_angle_deg=phase_angle, delta_km=float(moon_dist.km))
-        results.append(
-            {
-                "name": "Moon",
-                "type": "moon",
-                "magnitude": mag_moon,
-                "altitude_deg": float(moon_alt.degrees),
-                "azimuth_deg": float(moon_az.degrees) % 360.0,
-                "phase": frac,
-                "distance_km": float(moon_dist.km),
-            }
+    Cada cuerpo se observa una sola vez para todos los instantes, sobre la
+    geometría compartida de `_BodyGeometry`. Devuelve una lista de cuerpos por
+    instante (una sola si `t` es escalar), ordenada por altitud descendente.
+    """
+    geom = _BodyGeometry(latitude_deg, longitude_deg, t)
+    eph = geom.eph
+    frames: List[List[Dict[str, float]]] = [[] for _ in range(np.size(t.tt))]
+
+    def as_list(values) -> List[float]:
+        return np.atleast_1d(values).tolist()
+
+    for name, key in _TABLE_BODIES:
+        if name == "Sun":
+            app = geom.apparent(eph[key])
+            geo = helio = phase = np.zeros(len(frames))
+        else:
+            app, geo, helio, phase = geom.observe(eph[key])
+        alt, az, dist = app.altaz()
+        rows = zip(as_list(alt.degrees), as_list(az.degrees), as_list(dist.au), as_list(geo), as_list(helio), as_list(phase))
+        for results, (alt_deg, az_deg, d_au, geo_au, helio_au, phase_deg) in zip(frames, rows):
+            if alt_deg >= minimum_altitude_deg:
+                results.append(_body_item(name, alt_deg, az_deg, d_au, geo_au, helio_au, phase_deg))
+
+    return [_sort_bodies(results) for results in frames]
+
+
+# ---------------------- Tabla de efemérides precalculada ----------------------
+
+# Malla de la tabla: paso (horas) y ventana alrededor de "ahora" (días).
+BODY_TABLE_STEP_HOURS = 1.0
+BODY_TABLE_PAST_DAYS = 1.0
+BODY_TABLE_FUTURE_DAYS = 14.0
+# Tolerancia documentada frente al camino completo de Skyfield: posición
+# (alt/az) < 1" (máximo medido 0.47", dominado por la aberración diurna, que la tabla
+# geocéntrica no incluye), distancia relativa < 1e-5, magnitud < 0.001.
+BODY_TABLE_TOLERANCE_ARCSEC = 1.0
+
+# Orden de cuerpos de la tabla (y de las series): Sol, Luna y planetas
+_TABLE_BODIES: Tuple[Tuple[str, str], ...] = (("Sun", "sun"), ("Moon", "moon")) + _PLANET_BODIES
+
+
+class _BodyTable:
+    """Posiciones aparentes geocéntricas (vectores GCRS, AU), distancia heliocéntrica
+    y ángulo de fase de `_TABLE_BODIES` en una malla regular de tiempo TT.
+
+    Se construye con un `Time` array (una observación por cuerpo para toda la
+    malla) y se interpola con Lagrange cúbico (4 nodos): con paso de 1 h el error
+    de interpolación es << 0.01" incluso para la Luna.
+    """
+
+    def __init__(self, start_tt: float, days: float, step_hours: float = BODY_TABLE_STEP_HOURS) -> None:
+        self.step_days = step_hours / 24.0
+        n = int(math.ceil(days / self.step_days)) + 1
+        self.tt = start_tt + np.arange(n) * self.step_days
+        t = _timescale().tt_jd(self.tt)
+        eph = _load_ephemeris()
+        earth_at = eph["earth"].at(t)
+        sun_au = eph["sun"].at(t).position.au
+        self.geo = np.empty((len(_TABLE_BODIES), 3, n))
+        self.helio = np.zeros((len(_TABLE_BODIES), n))
+        self.phase = np.zeros((len(_TABLE_BODIES), n))
+        for k, (name, key) in enumerate(_TABLE_BODIES):
+            astrometric = earth_at.observe(eph[key])
+            self.geo[k] = astrometric.apparent().position.au
+            if name == "Sun":
+                continue
+            to_earth = -astrometric.position.au
+            to_sun = sun_au - (earth_at.position.au + astrometric.position.au)
+            geo = np.sqrt(np.sum(to_earth * to_earth, axis=0))
+            self.helio[k] = np.sqrt(np.sum(to_sun * to_sun, axis=0))
+            cos_phase = np.sum(to_earth * to_sun, axis=0) / (geo * self.helio[k])
+            self.phase[k] = np.degrees(np.arccos(np.clip(cos_phase, -1.0, 1.0)))
+
+    def covers(self, tt: float) -> bool:
+        # Lagrange de 4 nodos: hace falta un nodo antes y dos después
+        return self.tt[1] <= tt <= self.tt[-2]
+
+    def interpolate(self, tt: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(geo (B, 3) AU, helio (B,) AU, fase (B,) deg) en `tt` (debe estar cubierto)."""
+        x = (tt - self.tt[0]) / self.step_days
+        i = min(int(math.floor(x)), len(self.tt) - 3)
+        u = x - i
+        w = np.array(
+            [
+                -u * (u - 1.0) * (u - 2.0) / 6.0,
+                (u + 1.0) * (u - 1.0) * (u - 2.0) / 2.0,
+                -(u + 1.0) * u * (u - 2.0) / 2.0,
+                (u + 1.0) * u * (u - 1.0) / 6.0,
+            ]
         )
+        nodes = slice(i - 1, i + 3)
+        return self.geo[:, :, nodes] @ w, self.helio[:, nodes] @ w, self.phase[:, nodes] @ w
 
-    # Planetas
-    earth = eph["earth"]
-    sun = eph["sun"]
-    for name, ptype, body in bodies_planets:
-        app = observer.at(t).observe(body).apparent()
-        alt, az, dist_topo = app.altaz()
-        alt_deg = float(alt.degrees)
-        if alt_deg < minimum_altitude_deg:
-            continue
 
-        # Distancia geocéntrica y heliocéntrica para magnitud
-        geo = earth.at(t).observe(body).apparent().distance().au
-        helio = sun.at(t).observe(body).apparent().distance().au
-        try:
-            phase = float(almanac.phase_angle(eph, body, t).degrees)
-        except Exception:
-            phase = 0.0
+_body_table: Optional[_BodyTable] = None
+_body_table_lock = threading.Lock()
+_body_table_refreshing = False
 
-        magnitude = _planet_magnitude(body.target_name.lower() if hasattr(body, "target_name") else name.lower(), helio, geo, phase)
 
-        item: Dict[str, float] = {
-            "name": name,
-            "type": ptype,
-            "altitude_deg": alt_deg,
-            "azimuth_deg": float(az.degrees) % 360.0,
-            "distance_au": float(dist_topo.au),
-        }
-        if magnitude is not None:
-            item["magnitude"] = magnitude
+def _body_table_window(now: Optional[datetime] = None) -> Tuple[float, float]:
+    """(tt inicial, días) de la ventana de la tabla, anclada al inicio del día UTC."""
+    now = now or datetime.now(timezone.utc)
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start = _timescale().from_datetime(day - timedelta(days=BODY_TABLE_PAST_DAYS))
+    return float(start.tt), BODY_TABLE_PAST_DAYS + BODY_TABLE_FUTURE_DAYS + 1.0
 
-        results.append(item)
 
-    # Ordenar por altitud descendente
-    results.sort(key=lambda x: x.get("altitude_deg", -1e9), reverse=True)
-    return results
+def refresh_body_table(now: Optional[datetime] = None) -> None:
+    """(Re)construye la tabla para la ventana actual. Se puede llamar al arrancar."""
+    global _body_table, _body_table_refreshing
+    try:
+        table = _BodyTable(*_body_table_window(now))
+        with _body_table_lock:
+            _body_table = table
+    finally:
+        with _body_table_lock:
+            _body_table_refreshing = False
+
+
+def warm_up_ephemeris() -> Dict[str, object]:
+    """Carga el kernel al arrancar y mapea los segmentos que usa el servicio.
+
+    Evalúa `SERVICE_BODY_KEYS` ahora y construye la tabla de efemérides,
+    para que el primer request no pague la carga.
+    Devuelve `ephemeris.ephemeris_status()`.
+    """
+    return warm_up(SERVICE_BODY_KEYS, _timescale().now(), on_ready=refresh_body_table)
+
+
+def _body_table_for(t) -> Optional[_BodyTable]:
+    """Tabla que cubre `t`, o None (el llamador usa el camino completo).
+
+    Si `t` cae en la ventana actual pero la tabla falta o quedó vieja, se lanza
+    la reconstrucción en un hilo de fondo sin bloquear el request.
+    """
+    global _body_table_refreshing
+    tt = float(t.tt)
+    table = _body_table
+    if table is not None and table.covers(tt):
+        return table
+    start_tt, days = _body_table_window()
+    if start_tt + 1.0 / 24.0 <= tt <= start_tt + days - 2.0 / 24.0:
+        with _body_table_lock:
+            if _body_table_refreshing:
+                return None
+            _body_table_refreshing = True
+        threading.Thread(target=refresh_body_table, name="body-table-refresh", daemon=True).start()
+    return None
+
+
+def _compute_visible_bodies_from_table(
+    table: _BodyTable,
+    latitude_deg: float,
+    longitude_deg: float,
+    t,
+    minimum_altitude_deg: float = -90.0,
+) -> List[Dict[str, float]]:
+    """Interpola la tabla geocéntrica y aplica por observador la corrección
+    topocéntrica (paralaje) y la rotación al horizonte local."""
+    geo, helio, phase = table.interpolate(float(t.tt))
+    topos = wgs84.latlon(latitude_degrees=float(latitude_deg), longitude_degrees=float(longitude_deg))
+    horizon = (geo - topos.at(t).position.au) @ topos.rotation_at(t).T
+    x, y, z = horizon[:, 0], horizon[:, 1], horizon[:, 2]
+    alt = np.degrees(np.arctan2(z, np.hypot(x, y))).tolist()
+    az = np.degrees(np.arctan2(y, x)).tolist()
+    dist = np.sqrt(x * x + y * y + z * z).tolist()
+    geo_dist = np.sqrt(np.sum(geo * geo, axis=1)).tolist()
+    helio_l, phase_l = helio.tolist(), phase.tolist()
+
+    results = [
+        _body_item(name, alt[k], az[k], dist[k], geo_dist[k], helio_l[k], phase_l[k])
+        for k, (name, _key) in enumerate(_TABLE_BODIES)
+        if alt[k] >= minimum_altitude_deg
+    ]
+    return _sort_bodies(results)
 
 
 # --------------------------- Eventos astronómicos ----------------------------
@@ -375,104 +694,264 @@ def _az_to_cardinal8(azimuth_deg: float) -> str:
     return dirs[ix]
 
 
+# Búsquedas independientes (fases lunares + una por planeta) corren en paralelo
+EVENTS_MAX_WORKERS = 8
+
+
+@lru_cache(maxsize=1)
+def _events_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=EVENTS_MAX_WORKERS, thread_name_prefix="astro-events")
+
+
+def _moon_phase_events(t0, t1) -> List[Dict[str, str]]:
+    """Fases principales de la Luna (nueva, cuartos, llena) entre t0 y t1."""
+    eph = _load_ephemeris()
+    f_moon = almanac.moon_phases(eph)
+    times_moon, phases = almanac.find_discrete(t0, t1, f_moon)
+    if len(times_moon) == 0:
+        return []
+    phase_names = {
+        0: "Luna nueva",
+        1: "Cuarto creciente",
+        2: "Luna llena",
+        3: "Cuarto menguante",
+    }
+    # Fracción iluminada para enriquecer descripción (una sola evaluación para todas las fases)
+    fractions = np.atleast_1d(almanac.fraction_illuminated(eph, "moon", times_moon))
+    events: List[Dict[str, str]] = []
+    for ti, ph, frac in zip(times_moon, phases, fractions):
+        pct = int(round(float(frac) * 100))
+        events.append(
+            {
+                "type": "moon_phase",
+                "time": _format_time_iso_z(ti),
+                "description": f"{phase_names.get(int(ph), 'Fase lunar')} ({pct}%)",
+            }
+        )
+    return events
+
+
+def _rise_set_events(name: str, key: str, latitude_deg: float, longitude_deg: float, t0, t1) -> List[Dict[str, str]]:
+    """Salidas y puestas de un cuerpo entre t0 y t1, con la dirección (cardinal) del evento."""
+    eph = _load_ephemeris()
+    body = eph[key]
+    topos = wgs84.latlon(latitude_degrees=float(latitude_deg), longitude_degrees=float(longitude_deg))
+    f_rs = almanac.risings_and_settings(eph, body, topos)
+    times, updown = almanac.find_discrete(t0, t1, f_rs)
+    # Determinar transición respecto al estado inicial
+    prev = bool(f_rs(t0))  # True si por encima del horizonte al inicio
+    crossings: List[Tuple[int, bool]] = []
+    for i, st in enumerate(updown):
+        st_bool = bool(st)
+        if st_bool != prev:
+            crossings.append((i, st_bool))
+        prev = st_bool
+    if not crossings:
+        return []
+
+    # Azimut de todos los cruces en una sola evaluación vectorizada
+    observer = _topocentric_observer(latitude_deg, longitude_deg)
+    _alt, az, _ = observer.at(times[[i for i, _ in crossings]]).observe(body).apparent().altaz()
+    events: List[Dict[str, str]] = []
+    for (i, rising), az_deg in zip(crossings, np.atleast_1d(az.degrees).tolist()):
+        dir_label = _az_to_cardinal8(float(az_deg))
+        events.append(
+            {
+                "type": "planet_rise" if rising else "planet_set",
+                "time": _format_time_iso_z(times[i]),
+                "description": f"{name} {'sale' if rising else 'se pone'} por el {dir_label}",
+            }
+        )
+    return events
+
+
+# Calendario de eventos: días UTC ya calculados que se reutilizan entre requests.
+# Las salidas/puestas se calculan en el centro de la celda (~5 km): el error medido
+# frente a la ubicación exacta es de hasta ~20 s en |lat| <= 60° (~10 s en Madrid)
+# y crece hacia los polos. Las fases lunares son globales.
+EVENT_CALENDAR_CELL_DEG = 0.05
+# Rangos más largos no pasan por el calendario (cálculo exacto, sin caché)
+EVENT_CALENDAR_MAX_RANGE_DAYS = 62
+# Tope global de días de salidas/puestas en caché, sumando todas las celdas
+# (~6 KB por celda-día medidos: ~12 MB por worker)
+EVENT_CALENDAR_MAX_CELL_DAYS = 2048
+EVENT_CALENDAR_MAX_GLOBAL_DAYS = 3660
+
+
+class _EventCalendar:
+    """Eventos agrupados por (clave, día UTC "AAAA-MM-DD"), calculados una sola vez por día.
+
+    `compute(key, t0, t1)` calcula los eventos de un tramo de días completos
+    para `key` (p. ej. la celda de ubicación). Un request solo calcula los
+    tramos que faltan, fuera del lock: los días en cálculo quedan marcados con
+    un Future, así que otro request que los necesite espera ese resultado en
+    vez de repetirlo, y los días ya guardados se leen sin esperar. Si `compute`
+    falla, no se guarda nada y la excepción llega a todos los que esperaban.
+
+    Guarda como máximo `max_days` días en total (LRU); el resultado se arma
+    antes de descartar, así que un rango más largo igual se devuelve completo.
+    """
+
+    def __init__(
+        self, compute: Callable[[Hashable, object, object], List[Dict[str, str]]], max_days: int
+    ) -> None:
+        self._compute = compute
+        self._max_days = max_days
+        self._days: "OrderedDict[Tuple[Hashable, str], List[Dict[str, str]]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[Hashable, str], "Future[Dict[str, List[Dict[str, str]]]]"] = {}
+        self._lock = threading.Lock()
+
+    def events(self, key: Hashable, start_dt: datetime, end_dt: datetime) -> List[Dict[str, str]]:
+        """Eventos de los días que tocan [start_dt, end_dt] (sin recortar a la hora). No mutar."""
+        first = start_dt.date()
+        days = [(first + timedelta(days=k)).isoformat() for k in range((end_dt.date() - first).days + 1)]
+        found: Dict[str, List[Dict[str, str]]] = {}
+        waiting: Dict[str, "Future[Dict[str, List[Dict[str, str]]]]"] = {}
+        owned: List[Tuple[List[str], "Future[Dict[str, List[Dict[str, str]]]]"]] = []
+        with self._lock:
+            missing: List[str] = []
+            for day in days:
+                cached = self._days.get((key, day))
+                if cached is not None:
+                    self._days.move_to_end((key, day))
+                    found[day] = cached
+                elif (key, day) in self._in_flight:
+                    waiting[day] = self._in_flight[(key, day)]
+                else:
+                    missing.append(day)
+            for run in _consecutive_runs(missing):
+                future: "Future[Dict[str, List[Dict[str, str]]]]" = Future()
+                for day in run:
+                    self._in_flight[(key, day)] = future
+                owned.append((run, future))
+
+        for n, (run, future) in enumerate(owned):
+            try:
+                buckets = self._fill(key, run)
+            except BaseException as exc:
+                with self._lock:
+                    for pending_run, pending in owned[n:]:
+                        for day in pending_run:
+                            self._in_flight.pop((key, day), None)
+                        pending.set_exception(exc)
+                raise
+            with self._lock:
+                for day, day_events in buckets.items():
+                    self._days[(key, day)] = day_events
+                    self._in_flight.pop((key, day), None)
+                while len(self._days) > self._max_days:
+                    self._days.popitem(last=False)
+            future.set_result(buckets)
+            found.update(buckets)
+
+        for day, future in waiting.items():
+            found[day] = future.result()[day]
+        return [event for day in days for event in found[day]]
+
+    def _fill(self, key: Hashable, run: List[str]) -> Dict[str, List[Dict[str, str]]]:
+        ts = _timescale()
+        start = datetime.fromisoformat(run[0]).replace(tzinfo=timezone.utc)
+        t0 = ts.from_datetime(start)
+        t1 = ts.from_datetime(start + timedelta(days=len(run)))
+        buckets: Dict[str, List[Dict[str, str]]] = {day: [] for day in run}
+        for event in self._compute(key, t0, t1):
+            # Un evento redondeado al segundo puede caer en el día siguiente: queda en el tramo
+            day = min(max(event["time"][:10], run[0]), run[-1])
+            buckets[day].append(event)
+        return buckets
+
+
+def _consecutive_runs(days: List[str]) -> Iterator[List[str]]:
+    run: List[str] = []
+    for day in days:
+        if run and (date.fromisoformat(day) - date.fromisoformat(run[-1])).days != 1:
+            yield run
+            run = []
+        run.append(day)
+    if run:
+        yield run
+
+
+def _gather_rise_set_events(cell: Tuple[float, float], t0, t1) -> List[Dict[str, str]]:
+    """Salidas/puestas de todos los planetas en paralelo. Falla si falla algún planeta
+    (el calendario no guarda días incompletos y el llamador usa el cálculo exacto)."""
+    pool = _events_executor()
+    futures = [pool.submit(_rise_set_events, name, key, cell[0], cell[1], t0, t1) for name, key in _PLANET_BODIES]
+    return [event for future in futures for event in future.result()]
+
+
+def _calendar_events(latitude_deg: float, longitude_deg: float, t_start: datetime, t_end: datetime) -> List[Dict[str, str]]:
+    """Eventos de los días que tocan [t_start, t_end], desde los calendarios (sin recortar)."""
+    cell = _quantize_observer(latitude_deg, longitude_deg, EVENT_CALENDAR_CELL_DEG)
+    moon = _events_executor().submit(_moon_phase_calendar().events, None, t_start, t_end)
+    events = list(_rise_set_calendar().events(cell, t_start, t_end))
+    events.extend(moon.result())
+    return events
+
+
+@lru_cache(maxsize=1)
+def _moon_phase_calendar() -> _EventCalendar:
+    return _EventCalendar(lambda _key, t0, t1: _moon_phase_events(t0, t1), EVENT_CALENDAR_MAX_GLOBAL_DAYS)
+
+
+@lru_cache(maxsize=1)
+def _rise_set_calendar() -> _EventCalendar:
+    # Un solo calendario para todas las celdas: el tope de días es global
+    return _EventCalendar(_gather_rise_set_events, EVENT_CALENDAR_MAX_CELL_DAYS)
+
+
 def get_astronomy_events(
     *,
     latitude_deg: float,
     longitude_deg: float,
     start_iso_utc: str,
     end_iso_utc: str,
+    use_calendar: bool = True,
 ) -> List[Dict[str, str]]:
     """
     Devuelve eventos astronómicos entre start y end (UTC):
     - planet_rise / planet_set para planetas principales
     - moon_phase para las 4 fases principales
+
+    Cada búsqueda (fases lunares y una por planeta) es independiente y corre en
+    `_events_executor`; el tiempo total es aprox. el del cuerpo más lento.
+    Si una búsqueda falla, sus eventos se omiten.
+
+    Con `use_calendar` (por defecto) los días ya calculados se reutilizan: fases
+    lunares globales y salidas/puestas por celda de `EVENT_CALENDAR_CELL_DEG`.
+    Rangos de más de `EVENT_CALENDAR_MAX_RANGE_DAYS` días, o un fallo del
+    calendario, usan el cálculo exacto.
     """
-    t_start = _parse_iso_datetime_utc(start_iso_utc)
-    t_end = _parse_iso_datetime_utc(end_iso_utc)
+    t_start, t0 = _parse_iso_time_utc(start_iso_utc)
+    t_end, t1 = _parse_iso_time_utc(end_iso_utc)
     if t_end <= t_start:
         raise ValueError("end_datetime debe ser posterior a start_datetime")
 
-    ts = load.timescale()
-    t0 = ts.from_datetime(t_start)
-    t1 = ts.from_datetime(t_end)
-
-    eph = _load_ephemeris()
-    topos = wgs84.latlon(latitude_degrees=float(latitude_deg), longitude_degrees=float(longitude_deg))
-
-    events: List[Dict[str, str]] = []
-
-    # 1) Fases de la luna (eventos discretos: nueva, cuarto creciente, llena, cuarto menguante)
-    try:
-        f_moon = almanac.moon_phases(eph)
-        times_moon, phases = almanac.find_discrete(t0, t1, f_moon)
-        phase_names = {
-            0: "Luna nueva",
-            1: "Cuarto creciente",
-            2: "Luna llena",
-            3: "Cuarto menguante",
-        }
-        for ti, ph in zip(times_moon, phases):
-            # Fracción iluminada para enriquecer descripción
-            frac = float(almanac.fraction_illuminated(eph, "moon", ti))
-            pct = int(round(frac * 100))
-            desc = f"{phase_names.get(int(ph), 'Fase lunar')} ({pct}%)"
-            events.append(
-                {
-                    "type": "moon_phase",
-                    "time": _format_time_iso_z(ti),
-                    "description": desc,
-                }
-            )
-    except Exception:
-        # Si falla, no incluimos fases
-        pass
-
-    # 2) Salidas y puestas de planetas principales
-    planets = [
-        ("Mercury", eph["mercury"]),
-        ("Venus", eph["venus"]),
-        ("Mars", eph["mars"]),
-        ("Jupiter", eph["jupiter barycenter"]),
-        ("Saturn", eph["saturn barycenter"]),
-        ("Uranus", eph["uranus barycenter"]),
-        ("Neptune", eph["neptune barycenter"]),
-    ]
-
-    for name, body in planets:
+    _load_ephemeris()  # cargar antes de repartir: los errores del kernel se propagan
+    events: Optional[List[Dict[str, str]]] = None
+    if use_calendar and (t_end.date() - t_start.date()).days < EVENT_CALENDAR_MAX_RANGE_DAYS:
         try:
-            f_rs = almanac.risings_and_settings(eph, body, topos)
-            times, updown = almanac.find_discrete(t0, t1, f_rs)
-            # Determinar transición respecto al estado inicial
-            state0 = bool(f_rs(t0))  # True si por encima del horizonte al inicio
-            prev = state0
-            for ti, st in zip(times, updown):
-                st_bool = bool(st)
-                # Evento de cambio
-                if not prev and st_bool:
-                    # Rise
-                    alt, az, _ = topos.at(ti).observe(body).apparent().altaz()
-                    dir_label = _az_to_cardinal8(float(az.degrees))
-                    events.append(
-                        {
-                            "type": "planet_rise",
-                            "time": _format_time_iso_z(ti),
-                            "description": f"{name} sale por el {dir_label}",
-                        }
-                    )
-                elif prev and not st_bool:
-                    # Set
-                    alt, az, _ = topos.at(ti).observe(body).apparent().altaz()
-                    dir_label = _az_to_cardinal8(float(az.degrees))
-                    events.append(
-                        {
-                            "type": "planet_set",
-                            "time": _format_time_iso_z(ti),
-                            "description": f"{name} se pone por el {dir_label}",
-                        }
-                    )
-                prev = st_bool
+            day_events = _calendar_events(latitude_deg, longitude_deg, t_start, t_end)
         except Exception:
-            continue
+            day_events = None
+        if day_events is not None:
+            # Recortar los días completos al rango pedido (copias: el calendario no se muta)
+            first, last = _format_time_iso_z(t0), _format_time_iso_z(t1)
+            events = [dict(e) for e in day_events if first <= e["time"] <= last]
+    if events is None:
+        pool = _events_executor()
+        events = []
+        futures = [pool.submit(_moon_phase_events, t0, t1)]
+        futures.extend(
+            pool.submit(_rise_set_events, name, key, latitude_deg, longitude_deg, t0, t1)
+            for name, key in _PLANET_BODIES
+        )
+        for future in futures:
+            try:
+                events.extend(future.result())
+            except Exception:
+                # Si falla un cuerpo, no incluimos sus eventos
+                continue
 
     # Orden por tiempo
     events.sort(key=lambda e: e.get("time", ""))
@@ -491,6 +970,80 @@ def _iterate_datetimes_utc(start_dt: datetime, end_dt: datetime, step_hours: flo
         cur = cur + step
 
 
+def _batch_datetimes(start_iso_utc: str, end_iso_utc: str, step_hours: float) -> Iterator[datetime]:
+    """Instantes del batch. Valida de forma inmediata (no al iterar) para que los
+    errores de parámetros salgan antes de empezar un stream."""
+    start_dt = _parse_iso_datetime_utc(start_iso_utc)
+    end_dt = _parse_iso_datetime_utc(end_iso_utc)
+    if step_hours <= 0:
+        raise ValueError("step_hours debe ser > 0")
+    if end_dt <= start_dt:
+        return iter(())
+    return _iterate_datetimes_utc(start_dt, end_dt, step_hours)
+
+
+# Instantes por bloque en el motor batch: acota la matriz (tiempo x estrella) en memoria
+# y permite emitir los primeros frames de un stream sin esperar al rango completo.
+BATCH_TIME_BLOCK = 64
+
+
+def iter_visible_stars_batch(
+    *,
+    latitude_deg: float,
+    longitude_deg: float,
+    start_iso_utc: str,
+    end_iso_utc: str,
+    step_hours: float = 1.0,
+    max_magnitude: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Dict[str, object]]:
+    """Versión generadora de `get_visible_stars_batch`: cada frame se produce al
+    calcularse, con memoria acotada a un bloque de `BATCH_TIME_BLOCK` instantes.
+
+    Sin filtro de altitud y ordenado por magnitud, la selección de estrellas
+    (magnitud máxima, orden y límite) no depende del tiempo: se resuelve una vez
+    y solo esas filas entran en la matriz alt/az (tiempo x estrella), calculada
+    en un paso vectorizado por bloque sobre todos los LST.
+    """
+    datetimes = _batch_datetimes(start_iso_utc, end_iso_utc, step_hours)
+
+    catalog = load_star_catalog()
+    magnitude = catalog.magnitude
+    # Misma selección que `get_visible_stars(minimum_altitude_deg=-90, sort_by_magnitude=True)`
+    idx = np.arange(len(catalog)) if max_magnitude is None else np.flatnonzero(magnitude <= max_magnitude)
+    idx = idx[np.argsort(magnitude[idx], kind="stable")]
+    if limit is not None and limit > 0:
+        idx = idx[:limit]
+    ra_hours = catalog.ra_hours[idx]
+    dec_deg = catalog.dec_deg[idx]
+
+    def frames() -> Iterator[Dict[str, object]]:
+        # Dicts base por estrella (campos fijos); por frame solo cambian alt/az
+        base = [_star_result_item(catalog.star(i), 0.0, 0.0) for i in idx.tolist()]
+        while True:
+            # Al segundo entero, igual que la etiqueta `at` (y que `iter_visible_bodies_batch`)
+            block = [d.replace(microsecond=0) for d in itertools.islice(datetimes, BATCH_TIME_BLOCK)]
+            if not block:
+                break
+            lst = np.array([_lst_hours(longitude_deg, d) for d in block])[:, None]
+            alt_deg, az_deg = _equatorial_to_horizontal_array(
+                ra_hours=ra_hours,
+                dec_deg=dec_deg,
+                latitude_deg=latitude_deg,
+                lst_hours=lst,
+            )
+            for d, alt_row, az_row in zip(block, alt_deg.tolist(), az_deg.tolist()):
+                yield {
+                    "at": _format_time_iso_z(d),
+                    "stars": [
+                        {**item, "altitude_deg": a, "azimuth_deg": z}
+                        for item, a, z in zip(base, alt_row, az_row)
+                    ],
+                }
+
+    return frames()
+
+
 def get_visible_stars_batch(
     *,
     latitude_deg: float,
@@ -501,25 +1054,49 @@ def get_visible_stars_batch(
     max_magnitude: Optional[float] = None,
     limit: Optional[int] = None,
 ) -> List[Dict[str, object]]:
-    start_dt = _parse_iso_datetime_utc(start_iso_utc)
-    end_dt = _parse_iso_datetime_utc(end_iso_utc)
-    if end_dt <= start_dt:
-        return []
-
-    frames: List[Dict[str, object]] = []
-    for dt in _iterate_datetimes_utc(start_dt, end_dt, step_hours):
-        iso = _format_time_iso_z(dt)
-        stars = get_visible_stars(
+    return list(
+        iter_visible_stars_batch(
             latitude_deg=latitude_deg,
             longitude_deg=longitude_deg,
-            when_iso_utc=iso,
-            minimum_altitude_deg=-90.0,
-            limit=limit,
-            sort_by_magnitude=True,
+            start_iso_utc=start_iso_utc,
+            end_iso_utc=end_iso_utc,
+            step_hours=step_hours,
             max_magnitude=max_magnitude,
+            limit=limit,
         )
-        frames.append({"at": iso, "stars": stars})
-    return frames
+    )
+
+
+def iter_visible_bodies_batch(
+    *,
+    latitude_deg: float,
+    longitude_deg: float,
+    start_iso_utc: str,
+    end_iso_utc: str,
+    step_hours: float = 1.0,
+    limit: Optional[int] = None,
+) -> Iterator[Dict[str, object]]:
+    """Versión generadora de `get_visible_bodies_batch` (ver `iter_visible_stars_batch`).
+
+    Cada bloque de `BATCH_TIME_BLOCK` instantes se resuelve con un `Time` array de
+    Skyfield: una observación por cuerpo para todo el bloque.
+    """
+    datetimes = _batch_datetimes(start_iso_utc, end_iso_utc, step_hours)
+
+    def frames() -> Iterator[Dict[str, object]]:
+        while True:
+            block = list(itertools.islice(datetimes, BATCH_TIME_BLOCK))
+            if not block:
+                break
+            # Al segundo, como el ISO de cada frame
+            t = _timescale().from_datetimes([d.replace(microsecond=0) for d in block])
+            series = _compute_visible_bodies_series(latitude_deg, longitude_deg, t)
+            for d, bodies in zip(block, series):
+                if limit is not None and limit > 0:
+                    bodies = bodies[:limit]
+                yield {"at": _format_time_iso_z(d), "bodies": bodies}
+
+    return frames()
 
 
 def get_visible_bodies_batch(
@@ -531,24 +1108,16 @@ def get_visible_bodies_batch(
     step_hours: float = 1.0,
     limit: Optional[int] = None,
 ) -> List[Dict[str, object]]:
-    start_dt = _parse_iso_datetime_utc(start_iso_utc)
-    end_dt = _parse_iso_datetime_utc(end_iso_utc)
-    if end_dt <= start_dt:
-        return []
-
-    frames: List[Dict[str, object]] = []
-    for dt in _iterate_datetimes_utc(start_dt, end_dt, step_hours):
-        iso = _format_time_iso_z(dt)
-        bodies = get_visible_bodies(
+    return list(
+        iter_visible_bodies_batch(
             latitude_deg=latitude_deg,
             longitude_deg=longitude_deg,
-            when_iso_utc=iso,
-            minimum_altitude_deg=-90.0,
+            start_iso_utc=start_iso_utc,
+            end_iso_utc=end_iso_utc,
+            step_hours=step_hours,
+            limit=limit,
         )
-        if limit is not None and limit > 0:
-            bodies = bodies[:limit]
-        frames.append({"at": iso, "bodies": bodies})
-    return frames
+    )
 
 
 def get_visible_stars(
@@ -560,6 +1129,8 @@ def get_visible_stars(
     limit: Optional[int] = None,
     sort_by_magnitude: bool = True,
     max_magnitude: Optional[float] = None,
+    location_tolerance_deg: Optional[float] = None,
+    cache_bucket_s: Optional[int] = None,
 ) -> List[Dict[str, float]]:
     """
     Calcula estrellas visibles y devuelve una lista de dicts con name, magnitude, altitude_deg, azimuth_deg.
@@ -570,60 +1141,125 @@ def get_visible_stars(
     - minimum_altitude_deg: Umbral de altitud para visibilidad
     - limit: Limitar la cantidad de resultados
     - sort_by_magnitude: True -> más brillantes primero, False -> más altos primero
+    - location_tolerance_deg / cache_bucket_s: opt-in al estado de cielo compartido
     """
-    dt = _parse_iso_datetime_utc(when_iso_utc)
-    lst_h = _lst_hours(longitude_deg, dt)
-
-    results: List[Dict[str, float]] = []
-    for star in load_star_catalog():
-        horiz = _equatorial_to_horizontal(
-            ra_hours=star.ra_hours,
-            dec_deg=star.dec_deg,
+    catalog = load_star_catalog()
+    magnitude = catalog.magnitude
+    if _sky_state_requested(location_tolerance_deg, cache_bucket_s):
+        state = get_sky_state(latitude_deg, longitude_deg, when_iso_utc, location_tolerance_deg, cache_bucket_s)
+        alt_deg, az_deg = state.star_altaz_lst()
+    else:
+        dt = _parse_iso_datetime_utc(when_iso_utc)
+        alt_deg, az_deg = _equatorial_to_horizontal_array(
+            ra_hours=catalog.ra_hours,
+            dec_deg=catalog.dec_deg,
             latitude_deg=latitude_deg,
-            lst_hours=lst_h,
+            lst_hours=_lst_hours(longitude_deg, dt),
         )
-        # No filtrar por altitud por defecto (minimum_altitude_deg=-90)
-        if horiz["altitude_deg"] >= minimum_altitude_deg:
-            result_item: Dict[str, float] = {
-                "name": star.name,
-                "magnitude": star.magnitude,
-                "altitude_deg": horiz["altitude_deg"],
-                "azimuth_deg": horiz["azimuth_deg"],
-            }
-            # Campos opcionales si existen
-            if star.distance_ly is not None:
-                result_item["distance_ly"] = star.distance_ly
-            if star.color_temp_K is not None:
-                result_item["color_temp_K"] = star.color_temp_K
-            if star.bv is not None:
-                result_item["bv"] = star.bv
-            if star.rgb_hex is not None:
-                result_item["rgb_hex"] = star.rgb_hex
-            if star.aliases is not None:
-                result_item["aliases"] = star.aliases
-            if star.ids is not None:
-                result_item["ids"] = star.ids
-
-            results.append(result_item)
-
-    # Filtrar por magnitud máxima si se solicita
+
+    # Filtros como máscaras: no se construye ningún dict hasta conocer la selección
+    # No filtrar por altitud por defecto (minimum_altitude_deg=-90)
+    mask = alt_deg >= minimum_altitude_deg
     if max_magnitude is not None:
-        results = [r for r in results if r["magnitude"] <= max_magnitude]
+        mask &= magnitude <= max_magnitude
+    idx = np.flatnonzero(mask)
 
-    # Ordenar por magnitud (más brillante primero) por defecto
+    # Ordenar por magnitud (más brillante primero) por defecto; orden estable como list.sort
     if sort_by_magnitude:
-        results.sort(key=lambda x: x["magnitude"])  # menor magnitud = más brillante
+        idx = idx[np.argsort(magnitude[idx], kind="stable")]
     else:
-        results.sort(key=lambda x: x["altitude_deg"], reverse=True)
+        idx = idx[np.argsort(-alt_deg[idx], kind="stable")]
 
     if limit is not None and limit > 0:
-        results = results[:limit]
+        idx = idx[:limit]
 
-    return results
+    return [
+        _star_result_item(catalog.star(i), alt, az)
+        for i, alt, az in zip(idx.tolist(), alt_deg[idx].tolist(), az_deg[idx].tolist())
+    ]
+
+
+# Tamaño por defecto del bucket (segundos) para el caché de lugares aparentes.
+# Precesión, nutación, aberración y deflexión varían < 0.1" en este intervalo.
+APPARENT_PLACE_BUCKET_S = 300
 
 
+def _apparent_star_set(star_set: str) -> Star:
+    """`Star` array de un conjunto con lugares aparentes cacheados: "catalog" | "iau_centroids"."""
+    if star_set == "catalog":
+        return _catalog_skyfield_star()
+    if star_set == "iau_centroids":
+        return _iau_centroid_star()[1]
+    raise KeyError(star_set)
 
-def compute_visible_stars(lat: float, lon: float, date_iso: Optional[str]) -> List[Dict[str, float]]:
+
+@lru_cache(maxsize=16)
+def _apparent_radec(star_set: str, bucket_index: int, bucket_s: int) -> Tuple[np.ndarray, np.ndarray]:
+    """RA (horas) / Dec (grados) aparentes geocéntricos de `star_set`, ecuador y equinoccio de la fecha.
+
+    Se evalúan en el punto medio del bucket `[bucket_index * bucket_s, (bucket_index + 1) * bucket_s)`
+    (segundos Unix), de modo que el trabajo caro se hace una vez por bucket y conjunto.
+    """
+    mid = datetime.fromtimestamp((bucket_index + 0.5) * bucket_s, tz=timezone.utc)
+    t = _timescale().from_datetime(mid)
+    earth = _load_ephemeris()["earth"]
+    ra, dec, _ = earth.at(t).observe(_apparent_star_set(star_set)).apparent().radec(epoch="date")
+    return np.asarray(ra.hours, dtype=np.float64), np.asarray(dec.degrees, dtype=np.float64)
+
+
+def _apparent_altaz(
+    star_set: str,
+    latitude_deg: float,
+    longitude_deg: float,
+    dt_utc: datetime,
+    t,
+    rows: Optional[np.ndarray] = None,
+    apparent_bucket_s: Optional[int] = APPARENT_PLACE_BUCKET_S,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Alt/az aparentes (grados) de las filas `rows` de `star_set` (todas si None).
+
+    Con `apparent_bucket_s` rota a alt/az los lugares aparentes del bucket
+    (`_apparent_radec`); si no, hace la observación topocéntrica completa.
+    """
+    if apparent_bucket_s:
+        bucket_s = int(apparent_bucket_s)
+        ra_app, dec_app = _apparent_radec(star_set, int(dt_utc.timestamp() // bucket_s), bucket_s)
+        if rows is not None:
+            ra_app, dec_app = ra_app[rows], dec_app[rows]
+        return _equatorial_to_horizontal_array(
+            ra_hours=ra_app,
+            dec_deg=dec_app,
+            latitude_deg=latitude_deg,
+            lst_hours=_normalize_hours(float(t.gast) + longitude_deg / 15.0),
+        )
+
+    # Una sola observación vectorial para todas las filas pedidas
+    star = _apparent_star_set(star_set)
+    if rows is not None:
+        star = Star(ra=Angle(radians=star.ra.radians[rows]), dec=Angle(radians=star.dec.radians[rows]))
+    observer = _topocentric_observer(latitude_deg, longitude_deg)
+    alt, az, _distance = observer.at(t).observe(star).apparent().altaz()
+    return np.asarray(alt.degrees, dtype=np.float64), np.asarray(az.degrees, dtype=np.float64) % 360.0
+
+
+def _catalog_altaz_apparent(
+    latitude_deg: float,
+    longitude_deg: float,
+    dt_utc: datetime,
+    t,
+    rows: Optional[np.ndarray] = None,
+    apparent_bucket_s: Optional[int] = APPARENT_PLACE_BUCKET_S,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Alt/az aparentes (grados) de las filas `rows` del catálogo (todas si None)."""
+    return _apparent_altaz("catalog", latitude_deg, longitude_deg, dt_utc, t, rows, apparent_bucket_s)
+
+
+def compute_visible_stars(
+    lat: float,
+    lon: float,
+    date_iso: Optional[str],
+    apparent_bucket_s: Optional[int] = APPARENT_PLACE_BUCKET_S,
+) -> List[Dict[str, float]]:
     """
     Calcula altitud y acimut usando Skyfield para las estrellas del catálogo.
     Devuelve solo estrellas con altitud > 0°.
@@ -632,49 +1268,221 @@ def compute_visible_stars(lat: float, lon: float, date_iso: Optional[str]) -> Li
     - lat: Latitud del observador (grados; sur negativo)
     - lon: Longitud del observador (grados; oeste negativo)
     - date_iso: Fecha/hora en ISO 8601 (UTC). Si None o vacío, usa ahora (UTC)
+    - apparent_bucket_s: Bucket (s) del caché de lugares aparentes. Por request solo se
+      aplica la rotación al horizonte con el GAST exacto (error < 1" frente al cálculo
+      completo, dominado por la aberración diurna). None/0 desactiva el caché.
 
     Retorna: Lista de dicts {name, magnitude, altitude_deg, azimuth_deg}
     """
-    dt_utc = _parse_iso_datetime_utc(date_iso)
-    ts = load.timescale()
-    t = ts.from_datetime(dt_utc)
-
-    observer = wgs84.latlon(latitude_degrees=float(lat), longitude_degrees=float(lon))
-
-    visible: List[Dict[str, float]] = []
-    for star in load_star_catalog():
-        sf_star = Star(ra_hours=star.ra_hours, dec_degrees=star.dec_deg)
-        astrometric = observer.at(t).observe(sf_star).apparent()
-        alt, az, _distance = astrometric.altaz()
-        alt_deg = float(alt.degrees)
-        # No filtrar por altitud aquí; el cliente decide si mostrar > 0°
-        item: Dict[str, float] = {
-            "name": star.name,
-            "magnitude": star.magnitude,
-            "altitude_deg": alt_deg,
-            "azimuth_deg": float(az.degrees) % 360.0,
-        }
-        # Campos opcionales si existen
-        if star.distance_ly is not None:
-            item["distance_ly"] = star.distance_ly
-        if star.color_temp_K is not None:
-            item["color_temp_K"] = star.color_temp_K
-        if star.bv is not None:
-            item["bv"] = star.bv
-        if star.rgb_hex is not None:
-            item["rgb_hex"] = star.rgb_hex
-        if star.aliases is not None:
-            item["aliases"] = star.aliases
-        if star.ids is not None:
-            item["ids"] = star.ids
+    dt_utc, t = _parse_iso_time_utc(date_iso)
+
+    catalog = load_star_catalog()
+    alt_deg, az_deg = _catalog_altaz_apparent(lat, lon, dt_utc, t, apparent_bucket_s=apparent_bucket_s)
+
+    # No filtrar por altitud aquí; el cliente decide si mostrar > 0°
+    return [
+        _star_result_item(catalog.star(i), a, z)
+        for i, (a, z) in enumerate(zip(alt_deg.tolist(), az_deg.tolist()))
+    ]
 
-        visible.append(item)
 
-    return visible
+# ------------------------- Estado del cielo compartido -------------------------
+
+# Tolerancia angular por defecto (grados, ~1 km) al cuantizar la ubicación del
+# observador cuando se pide el estado compartido sin tolerancia explícita.
+SKY_STATE_DEFAULT_TOLERANCE_DEG = 0.01
+
+# Estados de cielo en caché. Cada uno puede guardar alt/az de todo el catálogo
+# (`star_altaz_lst`, 16 bytes por estrella), así que el límite es chico: con el
+# bucket de 1 s de los endpoints AR hay un estado por celda y segundo activos.
+SKY_STATE_CACHE_SIZE = 64
+# Bucket implícito (s) cuando no se pide instante ni bucket: "ahora" con microsegundos
+# daría una clave nueva en cada request
+SKY_STATE_NOW_BUCKET_S = 1
+# Combinaciones (constelaciones, altitud mínima) de frames guardadas por estado
+SKY_STATE_MAX_FRAME_SETS = 8
+
+
+def _quantize_deg(value: float, res_deg: float) -> float:
+    return round(round(float(value) / res_deg) * res_deg, 9)
+
+
+def _quantize_observer(latitude_deg: float, longitude_deg: float, tolerance_deg: float) -> Tuple[float, float]:
+    """Centro de la celda de ubicación que contiene (lat, lon).
+
+    Las celdas miden `tolerance_deg` en latitud; en longitud se ensanchan con
+    1/cos(lat) (con un número entero de celdas por paralelo) para que el tamaño
+    angular real se mantenga en `tolerance_deg`.
+    """
+    if tolerance_deg <= 0:
+        raise ValueError("location_tolerance_deg debe ser > 0")
+    lat_q = max(-90.0, min(90.0, _quantize_deg(latitude_deg, tolerance_deg)))
+    cells = max(1, int(360.0 * math.cos(math.radians(lat_q)) / tolerance_deg))
+    lon_q = _quantize_deg((float(longitude_deg) + 180.0) % 360.0 - 180.0, 360.0 / cells)
+    if lon_q >= 180.0:
+        lon_q -= 360.0
+    return lat_q, lon_q
+
+
+def _bucket_iso_utc(when_iso_utc: Optional[str], bucket_s: int) -> str:
+    """Inicio (ISO Z) del bucket de `bucket_s` segundos que contiene `when_iso_utc` (o ahora)."""
+    dt = _parse_iso_datetime_utc(when_iso_utc)
+    start = math.floor(dt.timestamp() / bucket_s) * bucket_s
+    return _format_time_iso_z(datetime.fromtimestamp(start, tz=timezone.utc))
+
+
+def _sky_state_requested(location_tolerance_deg: Optional[float], cache_bucket_s: Optional[int]) -> bool:
+    return location_tolerance_deg is not None or (cache_bucket_s is not None and cache_bucket_s > 0)
+
+
+class SkyState:
+    """Cielo calculado para una celda de ubicación y un instante (o bucket) dados.
+
+    Se comparte entre todos los requests que caen en la misma celda/bucket. Cada
+    parte se calcula de forma perezosa, una sola vez, bajo el lock de la instancia.
+    """
+
+    def __init__(self, latitude_deg: float, longitude_deg: float, when_iso_utc: str) -> None:
+        self.latitude_deg = latitude_deg
+        self.longitude_deg = longitude_deg
+        self.when_iso_utc = when_iso_utc
+        self.dt, self.t = _parse_iso_time_utc(when_iso_utc)
+        self._lock = threading.Lock()
+        self._star_altaz_lst: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._bodies: Optional[List[Dict[str, float]]] = None
+        self._frames: Dict[Tuple[Tuple[str, ...], float], Tuple[Dict[str, object], ...]] = {}
+
+    def star_altaz_lst(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Alt/az de todo el catálogo con el modelo rápido (GMST) de `get_visible_stars`."""
+        with self._lock:
+            if self._star_altaz_lst is None:
+                catalog = load_star_catalog()
+                self._star_altaz_lst = _equatorial_to_horizontal_array(
+                    ra_hours=catalog.ra_hours,
+                    dec_deg=catalog.dec_deg,
+                    latitude_deg=self.latitude_deg,
+                    lst_hours=_lst_hours(self.longitude_deg, self.dt),
+                )
+            return self._star_altaz_lst
+
+    def bodies(self) -> List[Dict[str, float]]:
+        """Cuerpos del Sistema Solar (sin filtro de altitud). No mutar: usar copias."""
+        with self._lock:
+            if self._bodies is None:
+                self._bodies = _compute_visible_bodies(self.latitude_deg, self.longitude_deg, self.t)
+            return self._bodies
+
+    def constellation_frames(self, names: Tuple[str, ...], minimum_altitude_deg: float) -> Tuple[Dict[str, object], ...]:
+        """Frames de constelaciones (independientes de la orientación). No mutar: usar copias.
+
+        Solo se calculan las estrellas de `names` (no todo el catálogo). Se
+        guardan hasta `SKY_STATE_MAX_FRAME_SETS` combinaciones por estado.
+        """
+        key = (names, float(minimum_altitude_deg))
+        with self._lock:
+            frames = self._frames.get(key)
+            if frames is None:
+                frames = tuple(
+                    _compute_constellation_frames_at(
+                        _constellation_indices(list(names)),
+                        self.latitude_deg,
+                        self.longitude_deg,
+                        self.dt,
+                        self.t,
+                        minimum_altitude_deg,
+                    )
+                )
+                self._frames[key] = frames
+                while len(self._frames) > SKY_STATE_MAX_FRAME_SETS:
+                    del self._frames[next(iter(self._frames))]
+            return frames
+
+
+@lru_cache(maxsize=SKY_STATE_CACHE_SIZE)
+def _sky_state(latitude_q: float, longitude_q: float, time_key: str) -> SkyState:
+    return SkyState(latitude_q, longitude_q, time_key)
+
+
+def get_sky_state(
+    latitude_deg: float,
+    longitude_deg: float,
+    when_iso_utc: Optional[str],
+    location_tolerance_deg: Optional[float] = None,
+    cache_bucket_s: Optional[int] = None,
+) -> SkyState:
+    """Estado de cielo compartido para la celda de (lat, lon) y el bucket de tiempo.
+
+    - location_tolerance_deg: tamaño angular de la celda (def. `SKY_STATE_DEFAULT_TOLERANCE_DEG`)
+    - cache_bucket_s: si > 0, el tiempo se cuantiza a ese bucket; si no, se usa el instante
+      exacto de `when_iso_utc`. Sin `when_iso_utc` ("ahora") se usa un bucket de
+      `SKY_STATE_NOW_BUCKET_S`, para que requests simultáneos compartan el estado.
+    """
+    tolerance = SKY_STATE_DEFAULT_TOLERANCE_DEG if location_tolerance_deg is None else float(location_tolerance_deg)
+    lat_q, lon_q = _quantize_observer(latitude_deg, longitude_deg, tolerance)
+    if cache_bucket_s is not None and cache_bucket_s > 0:
+        time_key = _bucket_iso_utc(when_iso_utc, int(cache_bucket_s))
+    elif when_iso_utc is None:
+        time_key = _bucket_iso_utc(None, SKY_STATE_NOW_BUCKET_S)
+    else:
+        time_key = _parse_iso_datetime_utc(when_iso_utc).isoformat()
+    return _sky_state(lat_q, lon_q, time_key)
 
 
 # --------------------------- Constellation helpers ----------------------------
 
+@dataclass(frozen=True)
+class _ConstellationIndex:
+    """Definición de una constelación resuelta contra el catálogo (precalculada una vez)."""
+
+    name: str
+    star_names: Tuple[str, ...]  # estrellas presentes en el catálogo, en orden de definición
+    rows: np.ndarray             # filas del catálogo de `star_names`
+    edges: List[List[str]]       # aristas tal como vienen en la definición (salida JSON)
+    edge_pairs: np.ndarray       # (k, 2) posiciones en `rows` de aristas con ambos extremos en catálogo
+    positions: Dict[str, int]    # nombre -> posición en `star_names`
+
+
+@lru_cache(maxsize=None)
+def _constellation_index(constellation_name: str) -> _ConstellationIndex:
+    definition = get_constellation_definition(constellation_name)
+    catalog = load_star_catalog()
+    star_names: List[str] = []
+    rows: List[int] = []
+    for name in definition["stars"]:  # type: ignore[union-attr]
+        row = catalog.index_of(name)
+        if row is None:
+            # Si una estrella no existe en el catálogo, se omite
+            continue
+        star_names.append(name)
+        rows.append(row)
+    position = {name: i for i, name in enumerate(star_names)}
+    edges: List[List[str]] = definition["edges"]  # type: ignore[assignment]
+    pairs = [
+        (position[e[0]], position[e[1]])
+        for e in edges
+        if len(e) == 2 and e[0] in position and e[1] in position
+    ]
+    return _ConstellationIndex(
+        name=constellation_name,
+        star_names=tuple(star_names),
+        rows=np.asarray(rows, dtype=np.intp),
+        edges=edges,
+        edge_pairs=np.asarray(pairs, dtype=np.intp).reshape(-1, 2),
+        positions=position,
+    )
+
+
+def _constellation_indices(names: List[str]) -> List[_ConstellationIndex]:
+    indices: List[_ConstellationIndex] = []
+    for cname in names:
+        try:
+            indices.append(_constellation_index(cname))
+        except KeyError:
+            # Constelación desconocida: se omite, como antes
+            continue
+    return indices
+
+
 def get_constellation_frame(
     *,
     constellation_name: str,
@@ -682,6 +1490,8 @@ def get_constellation_frame(
     longitude_deg: float,
     when_iso_utc: Optional[str] = None,
     minimum_altitude_deg: float = 0.0,
+    location_tolerance_deg: Optional[float] = None,
+    cache_bucket_s: Optional[int] = None,
 ) -> Dict[str, object]:
     """
     Devuelve las posiciones de las estrellas principales de una constelación y
@@ -695,35 +1505,56 @@ def get_constellation_frame(
       "edges": [[fromName, toName], ...]
     }
     """
-    dt = _parse_iso_datetime_utc(when_iso_utc)
-    ts = load.timescale()
-    t = ts.from_datetime(dt)
+    index = _constellation_index(constellation_name)
+    if _sky_state_requested(location_tolerance_deg, cache_bucket_s):
+        state = get_sky_state(latitude_deg, longitude_deg, when_iso_utc, location_tolerance_deg, cache_bucket_s)
+        return dict(state.constellation_frames((constellation_name,), minimum_altitude_deg)[0])
 
-    definition = get_constellation_definition(constellation_name)
-    star_names: List[str] = definition["stars"]  # type: ignore[index]
-    edges: List[List[str]] = definition["edges"]  # type: ignore[index]
+    dt, t = _parse_iso_time_utc(when_iso_utc)
+    return _compute_constellation_frames_at([index], latitude_deg, longitude_deg, dt, t, minimum_altitude_deg)[0]
 
-    observer = wgs84.latlon(latitude_degrees=float(latitude_deg), longitude_degrees=float(longitude_deg))
 
-    # Index catálogo por nombre para acceso rápido
-    catalog_index: Dict[str, CatalogStar] = {s.name: s for s in load_star_catalog()}
+def _compute_constellation_frames_at(
+    indices: List[_ConstellationIndex],
+    latitude_deg: float,
+    longitude_deg: float,
+    dt: datetime,
+    t,
+    minimum_altitude_deg: float,
+) -> List[Dict[str, object]]:
+    """Motor de una sola pasada: alt/az de todas las estrellas pedidas en un solo cálculo."""
+    union_rows = np.unique(np.concatenate([ix.rows for ix in indices])) if indices else np.empty(0, dtype=np.intp)
+    if len(union_rows):
+        alt_u, az_u = _catalog_altaz_apparent(latitude_deg, longitude_deg, dt, t, rows=union_rows)
+    else:
+        alt_u = az_u = np.empty(0)
+    frames: List[Dict[str, object]] = []
+    for ix in indices:
+        pos = np.searchsorted(union_rows, ix.rows)
+        frames.append(_build_constellation_frame(ix, dt, alt_u[pos], az_u[pos], minimum_altitude_deg))
+    return frames
+
+
+def _build_constellation_frame(
+    index: _ConstellationIndex,
+    dt: datetime,
+    alt_deg: np.ndarray,
+    az_deg: np.ndarray,
+    minimum_altitude_deg: float,
+) -> Dict[str, object]:
+    """Arma el frame de una constelación; `alt_deg`/`az_deg` alineados con `index.rows`."""
+    magnitude = load_star_catalog().magnitude[index.rows]
+    edges = index.edges
 
     positioned: List[Dict[str, float]] = []
-    for name in star_names:
-        cat_star = catalog_index.get(name)
-        if not cat_star:
-            # Si una estrella no existe en el catálogo, se omite
-            continue
-        sf_star = Star(ra_hours=cat_star.ra_hours, dec_degrees=cat_star.dec_deg)
-        alt, az, _ = observer.at(t).observe(sf_star).apparent().altaz()
-        alt_deg = float(alt.degrees)
-        if alt_deg >= minimum_altitude_deg:
+    for name, mag, alt, az in zip(index.star_names, magnitude.tolist(), alt_deg.tolist(), az_deg.tolist()):
+        if alt >= minimum_altitude_deg:
             positioned.append(
                 {
                     "name": name,
-                    "magnitude": cat_star.magnitude,
-                    "altitude_deg": alt_deg,
-                    "azimuth_deg": float(az.degrees) % 360.0,
+                    "magnitude": mag,
+                    "altitude_deg": alt,
+                    "azimuth_deg": az % 360.0,
                 }
             )
     below = len(positioned) == 0
@@ -752,7 +1583,7 @@ def get_constellation_frame(
             center = {"altitude_deg": float(alt_c), "azimuth_deg": float(az_c)}
 
     out: Dict[str, object] = {
-        "name": constellation_name,
+        "name": index.name,
         "at": _format_time_iso_z(dt),
         "below_horizon": below,
         "stars": positioned if not below else [],
@@ -768,6 +1599,19 @@ def get_circumpolar_constellations() -> List[str]:
     return list_constellations()
 
 
+def _compute_constellation_frames(
+    names: List[str],
+    latitude_deg: float,
+    longitude_deg: float,
+    when_iso_utc: Optional[str],
+    minimum_altitude_deg: float,
+) -> List[Dict[str, object]]:
+    dt, t = _parse_iso_time_utc(when_iso_utc)
+    return _compute_constellation_frames_at(
+        _constellation_indices(names), latitude_deg, longitude_deg, dt, t, minimum_altitude_deg
+    )
+
+
 def get_all_constellations_frames(
     *,
     latitude_deg: float,
@@ -781,23 +1625,32 @@ def get_all_constellations_frames(
     fov_h_deg: Optional[float] = None,
     fov_v_deg: Optional[float] = None,
     clip_edges_to_fov: bool = False,
+    cache_bucket_s: Optional[int] = None,
+    location_tolerance_deg: Optional[float] = None,
+    sky_state: Optional[SkyState] = None,
 ) -> List[Dict[str, object]]:
+    """Frames de varias constelaciones, con filtro/orden/recorte opcional por FOV.
+
+    Con `cache_bucket_s` > 0 o `location_tolerance_deg`, los frames salen del estado
+    de cielo compartido (`get_sky_state`): se reutilizan entre requests (p. ej.
+    clientes AR a 1 Hz) y solo el FOV/orientación se aplica por request. Si se pasa
+    `sky_state` (p. ej. el de una sesión de streaming) se usa directamente.
+    """
     all_names = names if names else list_constellations()
-    frames_raw: List[Dict[str, object]] = []
-    for cname in all_names:
-        try:
-            frame = get_constellation_frame(
-                constellation_name=cname,
-                latitude_deg=latitude_deg,
-                longitude_deg=longitude_deg,
-                when_iso_utc=when_iso_utc,
-                minimum_altitude_deg=minimum_altitude_deg,
-            )
-        except Exception:
-            continue
-        if not include_below_horizon and bool(frame.get("below_horizon", False)):
-            continue
-        frames_raw.append(frame)
+    if sky_state is not None or _sky_state_requested(location_tolerance_deg, cache_bucket_s):
+        state = sky_state if sky_state is not None else get_sky_state(
+            latitude_deg, longitude_deg, when_iso_utc, location_tolerance_deg, cache_bucket_s
+        )
+        # Copia superficial: los llamadores pueden anotar claves (p. ej. "style")
+        frames_all = [dict(f) for f in state.constellation_frames(tuple(all_names), minimum_altitude_deg)]
+    else:
+        frames_all = _compute_constellation_frames(
+            all_names, latitude_deg, longitude_deg, when_iso_utc, minimum_altitude_deg
+        )
+
+    frames_raw = [
+        f for f in frames_all if include_below_horizon or not bool(f.get("below_horizon", False))
+    ]
 
     # Opcional: filtro por FOV en base al centro
     def inside_fov(frame: Dict[str, object]) -> bool:
@@ -928,6 +1781,9 @@ def project_constellations_to_screen(
     clip_edges_to_fov: bool = True,
     heading_offset_deg: float = 0.0,
     roll_deg: float = 0.0,
+    cache_bucket_s: Optional[int] = None,
+    location_tolerance_deg: Optional[float] = None,
+    sky_state: Optional[SkyState] = None,
 ) -> List[Dict[str, object]]:
     """Devuelve frames con proyección a coordenadas de pantalla.
 
@@ -946,70 +1802,72 @@ def project_constellations_to_screen(
         fov_h_deg=fov_h_deg,
         fov_v_deg=fov_v_deg,
         clip_edges_to_fov=clip_edges_to_fov,
+        cache_bucket_s=cache_bucket_s,
+        location_tolerance_deg=location_tolerance_deg,
+        sky_state=sky_state,
     )
 
-    half_w = float(width_px) / 2.0
-    half_h = float(height_px) / 2.0
-    cos_r = math.cos(math.radians(roll_deg))
-    sin_r = math.sin(math.radians(roll_deg))
-
-    def to_screen(az: float, alt: float) -> Dict[str, float]:
-        dx = _wrap_delta_az_deg(az, fov_center_az_deg + heading_offset_deg)
-        dy = alt - fov_center_alt_deg
-        x = (dx / fov_h_deg) * float(width_px)
-        y = -(dy / fov_v_deg) * float(height_px)
-        # rotate by roll around screen center
-        xr = x * cos_r - y * sin_r
-        yr = x * sin_r + y * cos_r
-        return {"x_px": float(half_w + xr), "y_px": float(half_h + yr)}
+    # Todas las estrellas de todos los frames en una sola pasada vectorizada
+    star_lists = [f.get("stars") if isinstance(f.get("stars"), list) else [] for f in frames]
+    flat = [st for stars in star_lists for st in stars if isinstance(st, dict)]
+    az = np.fromiter((float(st.get("azimuth_deg", 0.0)) for st in flat), dtype=np.float64, count=len(flat))
+    alt = np.fromiter((float(st.get("altitude_deg", -90.0)) for st in flat), dtype=np.float64, count=len(flat))
+    x_px, y_px, inside = _project_to_screen_arrays(
+        az_deg=az,
+        alt_deg=alt,
+        fov_center_az_deg=fov_center_az_deg,
+        fov_center_alt_deg=fov_center_alt_deg,
+        fov_h_deg=fov_h_deg,
+        fov_v_deg=fov_v_deg,
+        width_px=width_px,
+        height_px=height_px,
+        heading_offset_deg=heading_offset_deg,
+        roll_deg=roll_deg,
+    )
+    keep = inside if not include_offscreen else np.ones(len(flat), dtype=bool)
+    az_l, alt_l, x_l, y_l = az.tolist(), alt.tolist(), x_px.tolist(), y_px.tolist()
+    keep_l, inside_l = keep.tolist(), inside.tolist()
 
     projected: List[Dict[str, object]] = []
-    for frame in frames:
-        stars = frame.get("stars")
-        if not isinstance(stars, list):
+    g = 0  # índice global en `flat`
+    for frame, stars in zip(frames, star_lists):
+        if not isinstance(frame.get("stars"), list):
             projected.append(frame)
             continue
+        try:
+            index: Optional[_ConstellationIndex] = _constellation_index(str(frame.get("name")))
+        except KeyError:
+            index = None
+        # slot[p] = índice global de la estrella en posición p de la constelación (-1 = no está en pantalla)
+        slot = np.full(len(index.star_names) if index is not None else 0, -1, dtype=np.intp)
         screen_stars: List[Dict[str, object]] = []
-        pos_by_name: Dict[str, Dict[str, float]] = {}
-        for s in stars:
-            if not isinstance(s, dict):
+        for st in stars:
+            if not isinstance(st, dict):
                 continue
-            az = float(s.get("azimuth_deg", 0.0))
-            alt = float(s.get("altitude_deg", -90.0))
-            inside = _is_inside_fov(
-                az_deg=az,
-                alt_deg=alt,
-                fov_center_az_deg=fov_center_az_deg,
-                fov_center_alt_deg=fov_center_alt_deg,
-                fov_h_deg=fov_h_deg,
-                fov_v_deg=fov_v_deg,
-            )
-            if not include_offscreen and not inside:
-                continue
-            pt = to_screen(az, alt)
-            item = {
-                "name": s.get("name"),
-                "magnitude": s.get("magnitude"),
-                "azimuth_deg": az,
-                "altitude_deg": alt,
-                "x_px": pt["x_px"],
-                "y_px": pt["y_px"],
-            }
-            screen_stars.append(item)
-            pos_by_name[str(s.get("name"))] = pt
-
-        # Opcional: edges en pantalla si ambos extremos presentes
+            if keep_l[g]:
+                screen_stars.append(
+                    {
+                        "name": st.get("name"),
+                        "magnitude": st.get("magnitude"),
+                        "azimuth_deg": az_l[g],
+                        "altitude_deg": alt_l[g],
+                        "x_px": x_l[g],
+                        "y_px": y_l[g],
+                    }
+                )
+                p = index.positions.get(str(st.get("name"))) if index is not None else None
+                if p is not None and (not clip_edges_to_fov or inside_l[g]):
+                    slot[p] = g
+            g += 1
+
+        # Edges en pantalla si ambos extremos están presentes, resueltos por índice
         screen_edges: List[List[float]] = []
-        edges = frame.get("edges")
-        if isinstance(edges, list):
-            for e in edges:
-                if not isinstance(e, list) or len(e) != 2:
-                    continue
-                a, b = str(e[0]), str(e[1])
-                if a in pos_by_name and b in pos_by_name:
-                    pa = pos_by_name[a]
-                    pb = pos_by_name[b]
-                    screen_edges.append([pa["x_px"], pa["y_px"], pb["x_px"], pb["y_px"]])
+        if index is not None and len(index.edge_pairs):
+            ends = slot[index.edge_pairs]
+            ends = ends[(ends[:, 0] >= 0) & (ends[:, 1] >= 0)]
+            if len(ends):
+                a, b = ends[:, 0], ends[:, 1]
+                screen_edges = np.column_stack([x_px[a], y_px[a], x_px[b], y_px[b]]).tolist()
 
         new_frame = dict(frame)
         new_frame["screen_stars"] = screen_stars
@@ -1019,6 +1877,63 @@ def project_constellations_to_screen(
     return projected
 
 
+def _project_to_screen_arrays(
+    *,
+    az_deg: np.ndarray,
+    alt_deg: np.ndarray,
+    fov_center_az_deg: float,
+    fov_center_alt_deg: float,
+    fov_h_deg: float,
+    fov_v_deg: float,
+    width_px: int,
+    height_px: int,
+    heading_offset_deg: float = 0.0,
+    roll_deg: float = 0.0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Proyección FOV -> píxeles vectorizada. Devuelve (x_px, y_px, inside_fov)."""
+    # Mismo criterio que `_is_inside_fov` (centro sin corrección de brújula)
+    d_az = (az_deg - fov_center_az_deg + 180.0) % 360.0 - 180.0
+    dy = alt_deg - fov_center_alt_deg
+    inside = (np.abs(d_az) <= fov_h_deg / 2.0) & (np.abs(dy) <= fov_v_deg / 2.0)
+
+    dx = (az_deg - (fov_center_az_deg + heading_offset_deg) + 180.0) % 360.0 - 180.0
+    x = (dx / fov_h_deg) * float(width_px)
+    y = -(dy / fov_v_deg) * float(height_px)
+    # rotate by roll around screen center
+    cos_r = math.cos(math.radians(roll_deg))
+    sin_r = math.sin(math.radians(roll_deg))
+    xr = x * cos_r - y * sin_r
+    yr = x * sin_r + y * cos_r
+    return float(width_px) / 2.0 + xr, float(height_px) / 2.0 + yr, inside
+
+
+@lru_cache(maxsize=1)
+def _iau_centroid_star() -> Tuple[Tuple[str, ...], Star]:
+    """Nombres y `Star` de Skyfield con valores array para los centroides IAU."""
+    centroids = get_iau_constellation_centroids()
+    names = tuple(centroids.keys())
+    ra_deg = np.array([centroids[n][0] for n in names], dtype=np.float64)
+    dec_deg = np.array([centroids[n][1] for n in names], dtype=np.float64)
+    return names, Star(ra_hours=ra_deg / 15.0, dec_degrees=dec_deg)
+
+
+def _iau_centroids_altaz(
+    latitude_deg: float,
+    longitude_deg: float,
+    dt_utc: datetime,
+    t,
+    apparent_bucket_s: Optional[int] = APPARENT_PLACE_BUCKET_S,
+) -> Tuple[Tuple[str, ...], np.ndarray, np.ndarray]:
+    """Nombres y alt/az aparentes (grados) de todos los centroides IAU."""
+    names, _star = _iau_centroid_star()
+    if not names:
+        return names, np.zeros(0), np.zeros(0)
+    alt, az = _apparent_altaz(
+        "iau_centroids", latitude_deg, longitude_deg, dt_utc, t, apparent_bucket_s=apparent_bucket_s
+    )
+    return names, alt, az
+
+
 def resolve_iau_in_fov(
     *,
     latitude_deg: float,
@@ -1028,41 +1943,36 @@ def resolve_iau_in_fov(
     fov_center_alt_deg: float,
     fov_h_deg: float,
     fov_v_deg: float,
+    apparent_bucket_s: Optional[int] = APPARENT_PLACE_BUCKET_S,
 ) -> Optional[str]:
-    """Resuelve la constelación IAU cuyo centro (aprox) cae dentro del FOV.
-
-    Usa centroides aproximados a partir de los límites IAU. Convierte RA/Dec de
-    cada centro a alt-az con Skyfield y verifica si cae dentro del FOV.
+    """Resuelve la constelación IAU que corresponde al FOV.
+
+    Primero busca en el ráster IAU la constelación que contiene el centro del
+    FOV (O(1)). Si el centro no cae en ningún límite cargado, usa centroides
+    aproximados: elige el más cercano al centro de los que caen dentro del FOV.
+    Los lugares aparentes de los centroides se cachean por bucket de
+    `apparent_bucket_s` segundos (None/0 = observación completa con Skyfield);
+    por request solo se rota al horizonte y se aplica el test de FOV.
     """
-    ts = load.timescale()
-    dt = _parse_iso_datetime_utc(when_iso_utc)
-    t = ts.from_datetime(dt)
-    observer = wgs84.latlon(latitude_degrees=float(latitude_deg), longitude_degrees=float(longitude_deg))
-
-    centroids = get_iau_constellation_centroids()
+    dt, t = _parse_iso_time_utc(when_iso_utc)
+    ra_c, dec_c = _horizontal_to_equatorial(
+        fov_center_alt_deg, fov_center_az_deg, latitude_deg, _lst_hours(longitude_deg, dt)
+    )
+    name_at_center = find_constellation_by_radec(ra_c, dec_c)
+    if name_at_center is not None:
+        return name_at_center
 
-    def inside(az: float, alt: float) -> bool:
-        dx = abs(_wrap_delta_az_deg(az, fov_center_az_deg))
-        dy = abs(alt - fov_center_alt_deg)
-        return dx <= fov_h_deg / 2.0 and dy <= fov_v_deg / 2.0
-
-    best_name: Optional[str] = None
-    best_dist = 1e9
-    for name, (ra_c, dec_c) in centroids.items():
-        # Convertir RA/Dec a alt-az
-        sf_star = Star(ra_hours=float(ra_c) / 15.0, dec_degrees=float(dec_c))
-        alt, az, _ = observer.at(t).observe(sf_star).apparent().altaz()
-        az_deg = float(az.degrees) % 360.0
-        alt_deg = float(alt.degrees)
-        if inside(az_deg, alt_deg):
-            dx = _wrap_delta_az_deg(az_deg, fov_center_az_deg)
-            dy = alt_deg - fov_center_alt_deg
-            d = (dx * dx + dy * dy) ** 0.5
-            if d < best_dist:
-                best_dist = d
-                best_name = name
-
-    return best_name
+    names, alt_deg, az_deg = _iau_centroids_altaz(
+        latitude_deg, longitude_deg, dt, t, apparent_bucket_s=apparent_bucket_s
+    )
+    dx = _wrap_delta_az_deg(az_deg, fov_center_az_deg)
+    dy = alt_deg - fov_center_alt_deg
+    inside = (np.abs(dx) <= fov_h_deg / 2.0) & (np.abs(dy) <= fov_v_deg / 2.0)
+    if not inside.any():
+        return None
+    dist = np.where(inside, np.hypot(dx, dy), np.inf)
+    # argmin devuelve el primero en caso de empate, como el recorrido original
+    return names[int(np.argmin(dist))]
 
 
 def _euclid_dist2(ax: float, ay: float, bx: float, by: float) -> float:
@@ -1090,12 +2000,16 @@ def get_labels_for_screen(
     max_labels: int = 20,
     max_mag: float = 4.0,
     min_separation_px: float = 24.0,
+    cache_bucket_s: Optional[int] = None,
+    location_tolerance_deg: Optional[float] = None,
+    sky_state: Optional[SkyState] = None,
 ) -> List[Dict[str, object]]:
     """Selecciona estrellas brillantes para etiquetar, evitando solapamientos.
 
     Retorna lista de items: { name, magnitude, x_px, y_px, azimuth_deg, altitude_deg, constellation }
     """
-    frames = project_constellations_to_screen(
+    # Solo hacen falta posiciones de estrellas: sin aristas ni dicts intermedios de pantalla
+    frames = get_all_constellations_frames(
         latitude_deg=latitude_deg,
         longitude_deg=longitude_deg,
         when_iso_utc=when_iso_utc,
@@ -1106,51 +2020,110 @@ def get_labels_for_screen(
         fov_center_alt_deg=fov_center_alt_deg,
         fov_h_deg=fov_h_deg,
         fov_v_deg=fov_v_deg,
+        cache_bucket_s=cache_bucket_s,
+        location_tolerance_deg=location_tolerance_deg,
+        sky_state=sky_state,
+    )
+
+    flat: List[Tuple[str, Dict[str, object]]] = []
+    for f in frames:
+        const_name = str(f.get("name", ""))
+        stars = f.get("stars")
+        if isinstance(stars, list):
+            flat.extend((const_name, st) for st in stars if isinstance(st, dict))
+
+    def _mag(st: Dict[str, object]) -> float:
+        try:
+            return float(st.get("magnitude"))  # type: ignore[arg-type]
+        except Exception:
+            return 10.0
+
+    n = len(flat)
+    az = np.fromiter((float(st.get("azimuth_deg", 0.0)) for _, st in flat), dtype=np.float64, count=n)
+    alt = np.fromiter((float(st.get("altitude_deg", -90.0)) for _, st in flat), dtype=np.float64, count=n)
+    mag = np.fromiter((_mag(st) for _, st in flat), dtype=np.float64, count=n)
+    x_px, y_px, inside = _project_to_screen_arrays(
+        az_deg=az,
+        alt_deg=alt,
+        fov_center_az_deg=fov_center_az_deg,
+        fov_center_alt_deg=fov_center_alt_deg,
+        fov_h_deg=fov_h_deg,
+        fov_v_deg=fov_v_deg,
         width_px=width_px,
         height_px=height_px,
-        include_offscreen=False,
-        clip_edges_to_fov=True,
         heading_offset_deg=heading_offset_deg,
         roll_deg=roll_deg,
     )
 
-    candidates: List[Dict[str, object]] = []
-    for f in frames:
-        const_name = str(f.get("name", ""))
-        for s in f.get("screen_stars", []) or []:
-            try:
-                mag = float(s.get("magnitude"))
-            except Exception:
-                mag = 10.0
-            if mag > max_mag:
-                continue
-            candidates.append(
-                {
-                    "name": s.get("name"),
-                    "magnitude": mag,
-                    "x_px": float(s.get("x_px", 0.0)),
-                    "y_px": float(s.get("y_px", 0.0)),
-                    "azimuth_deg": float(s.get("azimuth_deg", 0.0)),
-                    "altitude_deg": float(s.get("altitude_deg", -90.0)),
-                    "constellation": const_name,
-                }
-            )
+    # Candidatas: dentro del FOV y suficientemente brillantes, ordenadas por brillo (estable)
+    candidates = np.flatnonzero(inside & (mag <= max_mag))
+    candidates = candidates[np.argsort(mag[candidates], kind="stable")]
 
-    # Ordenar por brillo (mag ascendente)
-    candidates.sort(key=lambda it: it.get("magnitude", 99.0))
+    chosen = _place_labels_greedy(
+        x_px[candidates].tolist(),
+        y_px[candidates].tolist(),
+        min_separation_px=float(min_separation_px),
+        max_labels=max_labels,
+    )
 
     selected: List[Dict[str, object]] = []
-    min_sep2 = float(min_separation_px) * float(min_separation_px)
-    for c in candidates:
-        if len(selected) >= max_labels:
-            break
+    for k in chosen:
+        i = int(candidates[k])
+        const_name, st = flat[i]
+        selected.append(
+            {
+                "name": st.get("name"),
+                "magnitude": float(mag[i]),
+                "x_px": float(x_px[i]),
+                "y_px": float(y_px[i]),
+                "azimuth_deg": float(az[i]),
+                "altitude_deg": float(alt[i]),
+                "constellation": const_name,
+            }
+        )
+    return selected
+
+
+def _place_labels_greedy(
+    xs: List[float],
+    ys: List[float],
+    *,
+    min_separation_px: float,
+    max_labels: int,
+) -> List[int]:
+    """Colocación greedy de labels en orden de prioridad con un spatial hash.
+
+    La grilla usa celdas de `min_separation_px`, así que cualquier label a menos de
+    esa distancia está en las 3x3 celdas vecinas: cada candidata se compara solo
+    con esas, en vez de con todas las ya elegidas. Devuelve índices elegidos.
+    """
+    chosen: List[int] = []
+    if max_labels <= 0:
+        return chosen
+    min_sep2 = min_separation_px * min_separation_px
+    cell = abs(min_separation_px)
+    if cell == 0.0:
+        # Sin separación mínima no hay colisiones posibles
+        return list(range(min(len(xs), max_labels)))
+
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    for k, (x, y) in enumerate(zip(xs, ys)):
+        cx = math.floor(x / cell)
+        cy = math.floor(y / cell)
         ok = True
-        for s in selected:
-            if _euclid_dist2(float(c["x_px"]), float(c["y_px"]), float(s["x_px"]), float(s["y_px"])) < min_sep2:
-                ok = False
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in grid.get((gx, gy), ()):
+                    if _euclid_dist2(x, y, xs[j], ys[j]) < min_sep2:
+                        ok = False
+                        break
+                if not ok:
+                    break
+            if not ok:
                 break
         if ok:
-            selected.append(c)
-
-    return selected
-
+            chosen.append(k)
+            grid.setdefault((cx, cy), []).append(k)
+            if len(chosen) >= max_labels:
+                break
+    return chosen
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from catalog import StarCatalog, compile_catalog, load_binary_catalog
+
+SOURCE_JSON = Path(__file__).resolve().parent / "star_catalog.json"
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    json_path = tmp_path / "star_catalog.json"
+    shutil.copyfile(SOURCE_JSON, json_path)
+    bin_path = tmp_path / "star_catalog.bin"
+    compile_catalog(json_path, bin_path)
+    return json_path, bin_path
+
+
+def test_binary_round_trip_matches_json(compiled):
+    json_path, bin_path = compiled
+    with json_path.open("r", encoding="utf-8") as f:
+        expected = StarCatalog.from_records(json.load(f))
+    cat = load_binary_catalog(bin_path, source_path=json_path)
+
+    assert cat.names == expected.names
+    for column in ("ra_hours", "dec_deg", "magnitude", "distance_ly", "color_temp_K", "bv"):
+        np.testing.assert_array_equal(getattr(cat, column), getattr(expected, column))
+    # Comparar por estrella cubre rgb_hex, alias e ids (tablas del heap)
+    assert [cat.star(i) for i in range(len(cat))] == [expected.star(i) for i in range(len(expected))]
+    assert cat.index_of(expected.names[-1]) == expected.index_of(expected.names[-1])
+
+
+def test_compile_reports_star_count(tmp_path):
+    with SOURCE_JSON.open("r", encoding="utf-8") as f:
+        n = len(json.load(f))
+    assert compile_catalog(SOURCE_JSON, tmp_path / "star_catalog.bin") == n
+
+
+def test_stale_binary_is_rejected(compiled):
+    json_path, bin_path = compiled
+    # Mismo tamaño, otro mtime
+    st = json_path.stat()
+    os.utime(json_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(ValueError, match="desactualizado"):
+        load_binary_catalog(bin_path, source_path=json_path)
+
+
+def test_edited_source_is_rejected(compiled):
+    json_path, bin_path = compiled
+    with json_path.open("a", encoding="utf-8") as f:
+        f.write("\n")
+    with pytest.raises(ValueError, match="desactualizado"):
+        load_binary_catalog(bin_path, source_path=json_path)
+
+
+def test_missing_source_keeps_binary(compiled):
+    json_path, bin_path = compiled
+    json_path.unlink()
+    assert len(load_binary_catalog(bin_path, source_path=json_path)) > 0
+
+
+def test_truncated_binary_is_rejected(compiled):
+    _json_path, bin_path = compiled
+    data = bin_path.read_bytes()
+    bin_path.write_bytes(data[:-1])
+    with pytest.raises(ValueError, match="truncado"):
+        load_binary_catalog(bin_path)
+    bin_path.write_bytes(data[:10])
+    with pytest.raises(ValueError, match="truncado"):
+        load_binary_catalog(bin_path)
+
+
+def test_foreign_file_is_rejected(tmp_path):
+    bin_path = tmp_path / "star_catalog.bin"
+    bin_path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError, match="incompatible"):
+        load_binary_catalog(bin_path)
@@ -0,0 +1,134 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from star_service import _EventCalendar
+
+
+class _FakeCompute:
+    """Un evento a las 12:00 por día, más uno que redondea al día siguiente."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.calls = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, key, t0, t1):
+        start = t0.utc_datetime().date()
+        end = t1.utc_datetime().date()
+        with self._lock:
+            self.calls.append((key, start.isoformat(), end.isoformat()))
+        if self.fail:
+            raise RuntimeError("cálculo fallido")
+        events = []
+        day = start
+        while day < end:
+            events.append({"type": "noon", "key": str(key), "time": f"{day.isoformat()}T12:00:00Z"})
+            day += timedelta(days=1)
+        events.append({"type": "late", "key": str(key), "time": f"{end.isoformat()}T00:00:00Z"})
+        return events
+
+
+def _dt(day: str, hour: int = 0) -> datetime:
+    return datetime.fromisoformat(day).replace(hour=hour, tzinfo=timezone.utc)
+
+
+def test_days_are_bucketed_and_reused():
+    compute = _FakeCompute()
+    cal = _EventCalendar(compute, max_days=100)
+
+    events = cal.events("a", _dt("2024-03-01", 18), _dt("2024-03-03", 6))
+    assert [e["time"] for e in events] == [
+        "2024-03-01T12:00:00Z",
+        "2024-03-02T12:00:00Z",
+        "2024-03-03T12:00:00Z",
+        # Redondeado al día siguiente: queda en el último día del tramo
+        "2024-03-04T00:00:00Z",
+    ]
+    assert compute.calls == [("a", "2024-03-01", "2024-03-04")]
+
+    # Solapado: solo se calculan los días que faltan
+    cal.events("a", _dt("2024-03-02"), _dt("2024-03-05"))
+    assert compute.calls[1:] == [("a", "2024-03-04", "2024-03-06")]
+    cal.events("a", _dt("2024-03-01"), _dt("2024-03-05"))
+    assert len(compute.calls) == 2
+
+
+def test_gap_is_filled_as_separate_run():
+    compute = _FakeCompute()
+    cal = _EventCalendar(compute, max_days=100)
+    cal.events("a", _dt("2024-03-02"), _dt("2024-03-02"))
+    events = cal.events("a", _dt("2024-03-01"), _dt("2024-03-03"))
+    assert compute.calls[1:] == [("a", "2024-03-01", "2024-03-02"), ("a", "2024-03-03", "2024-03-04")]
+    assert [e["time"][:10] for e in events if e["type"] == "noon"] == ["2024-03-01", "2024-03-02", "2024-03-03"]
+
+
+def test_keys_are_isolated():
+    compute = _FakeCompute()
+    cal = _EventCalendar(compute, max_days=100)
+    a = cal.events("a", _dt("2024-03-01"), _dt("2024-03-01"))
+    b = cal.events("b", _dt("2024-03-01"), _dt("2024-03-01"))
+    assert {e["key"] for e in a} == {"a"}
+    assert {e["key"] for e in b} == {"b"}
+    assert len(compute.calls) == 2
+
+
+def test_long_range_is_complete_and_cache_is_bounded():
+    compute = _FakeCompute()
+    cal = _EventCalendar(compute, max_days=3)
+    events = cal.events("a", _dt("2024-03-01"), _dt("2024-03-05"))
+    assert len([e for e in events if e["type"] == "noon"]) == 5
+    assert len(cal._days) == 3
+    assert list(cal._days) == [("a", "2024-03-03"), ("a", "2024-03-04"), ("a", "2024-03-05")]
+
+
+def test_eviction_is_least_recently_used():
+    compute = _FakeCompute()
+    cal = _EventCalendar(compute, max_days=2)
+    cal.events("a", _dt("2024-03-01"), _dt("2024-03-01"))
+    cal.events("b", _dt("2024-03-01"), _dt("2024-03-01"))
+    cal.events("a", _dt("2024-03-01"), _dt("2024-03-01"))  # lectura: pasa al final
+    cal.events("c", _dt("2024-03-01"), _dt("2024-03-01"))
+    assert list(cal._days) == [("a", "2024-03-01"), ("c", "2024-03-01")]
+    calls = len(compute.calls)
+    cal.events("b", _dt("2024-03-01"), _dt("2024-03-01"))
+    assert len(compute.calls) == calls + 1
+
+
+def test_failure_caches_nothing():
+    compute = _FakeCompute(fail=True)
+    cal = _EventCalendar(compute, max_days=10)
+    with pytest.raises(RuntimeError):
+        cal.events("a", _dt("2024-03-01"), _dt("2024-03-03"))
+    assert not cal._days
+    assert not cal._in_flight
+
+    compute.fail = False
+    assert len(cal.events("a", _dt("2024-03-01"), _dt("2024-03-03"))) == 4
+
+
+def test_concurrent_requests_compute_once():
+    compute = _FakeCompute()
+    release = threading.Event()
+    inner = compute.__call__
+
+    def slow(key, t0, t1):
+        release.wait(5)
+        return inner(key, t0, t1)
+
+    cal = _EventCalendar(slow, max_days=10)
+    results = []
+
+    def worker():
+        results.append(cal.events("a", _dt("2024-03-01"), _dt("2024-03-02")))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 4
+    assert all(r == results[0] for r in results)
+    assert len(compute.calls) == 1
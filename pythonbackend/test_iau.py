@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from iau import _classify_exact, _iau_index, find_constellation_by_radec, find_constellations_by_radec
+
+
+def _sample_points():
+    rng = np.random.default_rng(20240601)
+    n = 20000
+    ra = rng.uniform(0.0, 360.0, n)
+    # Uniforme sobre la esfera, más los polos y puntos sobre los vértices de los límites
+    dec = np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, n)))
+    vertices = np.array([v for poly in _iau_index().polygons for v in poly.vertices[::7]])
+    ra = np.concatenate([ra, [0.0, 123.0, 359.999], vertices[:, 0] % 360.0])
+    dec = np.concatenate([dec, [90.0, -90.0, 89.999], vertices[:, 1]])
+    return ra, dec
+
+
+def test_bulk_matches_exact_classifier():
+    ra, dec = _sample_points()
+    assert find_constellations_by_radec(ra, dec) == _classify_exact(ra % 360.0, np.clip(dec, -90.0, 90.0))
+
+
+def test_bulk_matches_scalar_lookup():
+    ra, dec = _sample_points()
+    ra, dec = ra[::20], dec[::20]
+    assert find_constellations_by_radec(ra, dec) == [find_constellation_by_radec(r, d) for r, d in zip(ra, dec)]
+
+
+def test_known_stars():
+    # Betelgeuse, Vega, Antares, Sirius; RA fuera de [0, 360) se normaliza
+    names = find_constellations_by_radec([88.79, 279.23, 247.35 - 360.0, 101.29], [7.41, 38.78, -26.43, -16.72])
+    assert names == ["Orion", "Lyra", "Scorpius", "Canis Major"]
+
+
+def test_empty_input():
+    assert find_constellations_by_radec([], []) == []
+
+
+@pytest.mark.parametrize("ra, dec", [([10.0, np.nan], [0.0, 0.0]), ([10.0], [np.inf]), ([-np.inf], [0.0])])
+def test_non_finite_is_rejected(ra, dec):
+    with pytest.raises(ValueError, match="finitos"):
+        find_constellations_by_radec(ra, dec)
+
+
+def test_length_mismatch_is_rejected():
+    with pytest.raises(ValueError, match="longitud"):
+        find_constellations_by_radec([10.0, 20.0], [0.0])
@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+SESSION = {
+    "type": "session",
+    "lat": 40.4168,
+    "lon": -3.7038,
+    "fov_h_deg": 60.0,
+    "fov_v_deg": 40.0,
+    "width_px": 1080,
+    "height_px": 720,
+}
+POSE = {"yaw_deg": 180.0, "pitch_deg": 30.0, "at": "2024-06-01T22:00:00Z"}
+
+
+@pytest.fixture
+def ws():
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/ar") as websocket:
+        yield websocket
+
+
+def _error(websocket) -> str:
+    reply = websocket.receive_json()
+    assert reply["type"] == "error"
+    return reply["detail"]
+
+
+def test_invalid_json_keeps_connection(ws):
+    ws.send_text("{no es json")
+    assert "JSON inválido" in _error(ws)
+    ws.send_json(SESSION)
+    assert ws.receive_json() == {"type": "session", "ok": True}
+
+
+def test_non_object_is_rejected(ws):
+    ws.send_text("[1, 2]")
+    assert _error(ws) == "Se espera un objeto JSON"
+
+
+def test_pose_before_session(ws):
+    ws.send_json(POSE)
+    assert "Abra la sesión primero" in _error(ws)
+
+
+@pytest.mark.parametrize(
+    "override",
+    [{"fov_h_deg": 0}, {"width_px": -1}, {"max_labels": -1}, {"location_tolerance_deg": 0}, {"lat": "norte"}],
+)
+def test_invalid_session_is_rejected(ws, override):
+    ws.send_json({**SESSION, **override})
+    _error(ws)
+    # Sin sesión abierta, una pose sigue siendo un error
+    ws.send_json(POSE)
+    assert "Abra la sesión primero" in _error(ws)
+
+
+def test_invalid_pose_then_valid_frame(ws):
+    ws.send_json(SESSION)
+    assert ws.receive_json()["ok"] is True
+    ws.send_json({**POSE, "yaw_deg": "norte"})
+    _error(ws)
+    ws.send_json({**POSE, "at": "ayer"})
+    _error(ws)
+    ws.send_json(POSE)
+    reply = ws.receive_json()
+    assert reply["type"] == "frame"
+    assert "frames" in reply